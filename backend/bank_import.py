@@ -0,0 +1,168 @@
+# Parsers for bank statement imports (see import_transactions in server.py).
+# Each parser yields one dict per booking: {'row', 'date', 'description',
+# 'amount', 'type', 'ref'} or {'row', 'error'} for lines it cannot read.
+import csv
+import hashlib
+import io
+import re
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+# Accepted CSV column names, lower-cased
+CSV_COLUMNS = {
+    'date': ('date', 'datum', 'buchungsdatum', 'valuta', 'valutadatum'),
+    'description': ('description', 'beschreibung', 'buchungstext', 'text', 'bezeichnung', 'mitteilung'),
+    'amount': ('amount', 'betrag'),
+    'credit': ('credit', 'gutschrift', 'eingang'),
+    'debit': ('debit', 'belastung', 'lastschrift', 'ausgang'),
+}
+
+
+def parse_date(value: str) -> str:
+    value = value.strip()
+    for fmt in ('%Y-%m-%d', '%d.%m.%Y', '%d.%m.%y', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(value, fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    raise ValueError(f"Unbekanntes Datum: {value}")
+
+
+def parse_amount(value: str) -> float:
+    """Read 1'234.50, 1,234.50 and 1.234,50 alike: the last separator is the decimal one.
+
+    A single separator followed by exactly three digits (1.234, 1,234) could
+    be either and is rejected rather than guessed.
+    """
+    text = re.sub(r"[\s'’]|CHF", '', value.strip())
+    separators = [char for char in text if char in '.,']
+    if not separators:
+        return float(text)
+
+    decimal = separators[-1]
+    if separators.count(decimal) > 1:
+        # 1.234.567: the only separator kind groups thousands
+        integer, fraction, thousands = text, '', decimal
+    else:
+        integer, fraction = text.rsplit(decimal, 1)
+        thousands = ',' if decimal == '.' else '.'
+        if len(separators) == 1 and len(fraction) == 3:
+            raise ValueError(f"Mehrdeutiger Betrag: {value}")
+    if thousands in integer and not re.fullmatch(rf"[+-]?\d{{1,3}}(\{thousands}\d{{3}})+", integer):
+        raise ValueError(f"Unbekannter Betrag: {value}")
+    return float(f"{integer.replace(thousands, '')}.{fraction or '0'}")
+
+
+def booking_ref(date: str, amount: float, type: str, description: str, occurrence: int = 0) -> str:
+    """Stable reference used to skip bookings that were imported before.
+
+    occurrence numbers identical bookings within one statement, so two equal
+    lessons on the same day get different refs.
+    """
+    key = f"{date}|{amount:.2f}|{type}|{description}"
+    if occurrence:
+        key += f"|{occurrence}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def booking(row: int, date: str, amount: float, description: str, ref: str = None, seen: dict = None) -> dict:
+    """One booking; without a bank ref one is derived, counting repeats in seen."""
+    type = 'income' if amount >= 0 else 'expense'
+    amount = round(abs(amount), 2)
+    if not ref:
+        ref = booking_ref(date, amount, type, description)
+        if seen is not None:
+            occurrence = seen.get(ref, 0)
+            seen[ref] = occurrence + 1
+            if occurrence:
+                ref = booking_ref(date, amount, type, description, occurrence)
+    return {
+        'row': row,
+        'date': date,
+        'description': description,
+        'amount': amount,
+        'type': type,
+        'ref': ref,
+    }
+
+
+def parse_csv(text: str):
+    dialect = csv.Sniffer().sniff(text[:4096], delimiters=';,\t')
+    reader = csv.reader(io.StringIO(text), dialect)
+    header = [column.strip().lower() for column in next(reader, [])]
+    columns = {}
+    for key, names in CSV_COLUMNS.items():
+        columns[key] = next((header.index(name) for name in names if name in header), None)
+    if columns['date'] is None or columns['description'] is None or (
+        columns['amount'] is None and columns['credit'] is None and columns['debit'] is None
+    ):
+        raise ValueError("CSV braucht Spalten fuer Datum, Beschreibung und Betrag")
+
+    def cell(values, key):
+        index = columns[key]
+        return values[index].strip() if index is not None and index < len(values) else ''
+
+    seen = {}
+    for row_number, values in enumerate(reader, start=2):
+        if not any(value.strip() for value in values):
+            continue
+        try:
+            if columns['amount'] is not None and cell(values, 'amount'):
+                amount = parse_amount(cell(values, 'amount'))
+            elif cell(values, 'credit'):
+                amount = parse_amount(cell(values, 'credit'))
+            else:
+                amount = -parse_amount(cell(values, 'debit'))
+            yield booking(row_number, parse_date(cell(values, 'date')), amount, cell(values, 'description'), seen=seen)
+        except ValueError as e:
+            yield {'row': row_number, 'error': str(e)}
+
+
+def parse_camt053(source):
+    """Stream the Ntry elements of an ISO 20022 camt.053 statement."""
+    def local(tag):
+        return tag.rsplit('}', 1)[-1]
+
+    def find(element, *paths):
+        """First element found along any of the '/'-separated paths."""
+        for path in paths:
+            found = element
+            for name in path.split('/'):
+                found = next((child for child in found if local(child.tag) == name), None)
+                if found is None:
+                    break
+            if found is not None:
+                return found
+        return None
+
+    def text(element):
+        return element.text.strip() if element is not None and element.text else ''
+
+    seen = {}
+    row_number = 0
+    for _, element in ET.iterparse(source):
+        if local(element.tag) != 'Ntry':
+            continue
+        row_number += 1
+        try:
+            amount = float(text(find(element, 'Amt')))
+            if text(find(element, 'CdtDbtInd')) == 'DBIT':
+                amount = -amount
+            date = text(find(element, 'BookgDt/Dt', 'BookgDt/DtTm', 'ValDt/Dt'))[:10]
+            description = text(find(element, 'NtryDtls/TxDtls/RmtInf/Ustrd', 'AddtlNtryInf', 'NtryDtls/TxDtls/AddtlTxInf'))
+            ref = text(find(element, 'AcctSvcrRef', 'NtryRef')) or None
+
+            yield booking(row_number, parse_date(date), amount, description, ref, seen)
+        except ValueError as e:
+            yield {'row': row_number, 'error': f"Buchung nicht lesbar: {e}"}
+        finally:
+            element.clear()
+
+
+def parse_statement(file_name: str, source) -> list:
+    """Parse a CSV or camt.053 statement from a binary file object."""
+    head = source.read(512)
+    source.seek(0)
+    if file_name.lower().endswith('.xml') or head.lstrip().startswith(b'<'):
+        return list(parse_camt053(source))
+    return list(parse_csv(source.read().decode('utf-8-sig', errors='replace')))
@@ -0,0 +1,47 @@
+import asyncio
+import os
+import re
+import time
+from server import client, db, UPLOAD_DIR, PREVIEW_DIR
+
+# Leave recently written files alone so an upload still being recorded is not removed
+MIN_AGE_SECONDS = 3600
+
+async def gc_uploads():
+    removed = 0
+    blobs = await db.file_blobs.find({"ref_count": {"$lte": 0}}, {"_id": 0}).to_list(None)
+    
+    for blob in blobs:
+        file_path = UPLOAD_DIR / blob['file_name']
+        if file_path.exists() and time.time() - file_path.stat().st_mtime < MIN_AGE_SECONDS:
+            continue
+        
+        result = await db.file_blobs.delete_one({"file_name": blob['file_name'], "ref_count": {"$lte": 0}})
+        if not result.deleted_count:
+            continue
+        
+        # Move the file aside first: an upload of the same content may have
+        # claimed the blob again since the delete (see save_upload)
+        parked_path = UPLOAD_DIR / f".gc_{blob['file_name']}"
+        try:
+            os.replace(file_path, parked_path)
+        except FileNotFoundError:
+            continue
+        if await db.file_blobs.find_one({"file_name": blob['file_name'], "ref_count": {"$gt": 0}}):
+            os.replace(parked_path, file_path)
+            continue
+        
+        parked_path.unlink()
+        # Previews are named by content, which a blob stored before extensions
+        # were lower-cased (x.JPG next to x.jpg) may still share
+        if not await db.file_blobs.find_one({"file_name": {"$regex": f"^{re.escape(file_path.stem)}\\."}}):
+            for preview in PREVIEW_DIR.glob(f"{file_path.stem}_*.webp"):
+                preview.unlink()
+        removed += 1
+    
+    print(f"Removed {removed} unreferenced uploads")
+    
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(gc_uploads())
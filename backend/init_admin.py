@@ -51,6 +51,8 @@ async def create_admin():
         existing = await db.accounts.find_one({"name": account["name"]})
         if not existing:
             await db.accounts.insert_one(account)
+    # Running workers revalidate their account cache against this counter
+    await db.versions.update_one({"key": "accounts"}, {"$inc": {"version": 1}}, upsert=True)
     
     print("Default accounts created!")
     
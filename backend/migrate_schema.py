@@ -0,0 +1,74 @@
+import asyncio
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+from server import client, db, to_rappen
+
+# Rewrites documents from before BSON dates, integer Rappen amounts and updated_at.
+# Safe to run while the app is serving: the app reads both shapes, each update
+# only applies if the old value is still there, and a rerun resumes the work.
+BATCH_SIZE = 1000
+
+DATE_FIELDS = [
+    ('users', 'created_at'),
+    ('accounts', 'created_at'),
+    ('transactions', 'created_at'),
+    ('bank_documents', 'created_at'),
+    ('misc_items', 'created_at'),
+    ('vehicles', 'created_at'),
+    ('service_entries', 'created_at'),
+    ('customers', 'created_at'),
+    ('customer_remarks', 'created_at'),
+    ('important_uploads', 'created_at'),
+    ('import_rules', 'created_at'),
+    ('file_blobs', 'created_at'),
+    ('month_locks', 'locked_at'),
+]
+
+def parse_datetime(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+async def migrate(collection: str, query: dict, source: str, target: str, convert):
+    """Set target = convert(source) on every document matching query, in _id order."""
+    migrated = failed = 0
+    last_id = None
+    while True:
+        page_query = query if last_id is None else {**query, "_id": {"$gt": last_id}}
+        docs = await db[collection].find(page_query, {"_id": 1, source: 1}).sort("_id", 1).limit(BATCH_SIZE).to_list(None)
+        if not docs:
+            break
+        last_id = docs[-1]['_id']
+
+        requests = []
+        for doc in docs:
+            try:
+                value = convert(doc[source])
+            except (ValueError, TypeError, KeyError):
+                failed += 1
+                continue
+            requests.append(UpdateOne({"_id": doc['_id'], source: doc[source]}, {"$set": {target: value}}))
+        if requests:
+            result = await db[collection].bulk_write(requests, ordered=False)
+            migrated += result.modified_count
+
+    print(f"{collection}.{target}: migrated {migrated}" + (f", {failed} unreadable" if failed else ""))
+
+async def migrate_schema():
+    for collection, field in DATE_FIELDS:
+        await migrate(collection, {field: {"$type": "string"}}, field, field, parse_datetime)
+
+    # Documents from before updated_at was stamped: last change unknown, use creation
+    for collection, field in DATE_FIELDS:
+        if field == 'created_at':
+            await migrate(collection, {"updated_at": {"$exists": False}, "created_at": {"$type": "date"}}, 'created_at', 'updated_at', lambda value: value)
+
+    await migrate(
+        'transactions',
+        {"amount_rappen": {"$exists": False}, "amount": {"$type": "number"}},
+        'amount', 'amount_rappen', to_rappen
+    )
+
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(migrate_schema())
@@ -0,0 +1,129 @@
+# PDF rendering for the report exports. Runs in worker processes (see
+# export_pdf in server.py), so it only takes plain dicts and returns bytes.
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import cm
+import io
+
+
+TITLE = "Fahrschule Saferide by Nadine Stäubli"
+
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('ALIGN', (3, 1), (4, -1), 'RIGHT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 9),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('BACKGROUND', (0, -2), (-1, -1), colors.lightgrey),
+])
+
+SUMMARY_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+])
+
+
+def month_table(transactions: list) -> Table:
+    """Transaction table of one month with its totals rows."""
+    # Table data
+    table_data = [['Datum', 'Bezeichnung', 'Konto', 'Einnahmen', 'Ausgaben', 'Bemerkungen']]
+    
+    total_income = 0
+    total_expense = 0
+    
+    for trans in transactions:
+        income = f"{trans['amount']:.2f}" if trans['type'] == 'income' else ''
+        expense = f"{trans['amount']:.2f}" if trans['type'] == 'expense' else ''
+        
+        if trans['type'] == 'income':
+            total_income += trans['amount']
+        else:
+            total_expense += trans['amount']
+        
+        table_data.append([
+            trans['date'],
+            trans['description'][:30],
+            (trans.get('account_name') or '')[:20],
+            income,
+            expense,
+            (trans.get('remarks') or '')[:30]
+        ])
+    
+    # Totals
+    table_data.append(['', '', 'Total:', f"{total_income:.2f}", f"{total_expense:.2f}", ''])
+    total_balance = total_income - total_expense
+    table_data.append(['', '', 'Einkommen:', '', f"{total_balance:.2f}", ''])
+    
+    # Create table - Adjusted for landscape
+    table = Table(table_data, colWidths=[3*cm, 5*cm, 4*cm, 3*cm, 3*cm, 4*cm], repeatRows=1)
+    table.setStyle(TABLE_STYLE)
+    return table
+
+
+def render_month_pdf(year: int, month: int, transactions: list) -> bytes:
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    styles = getSampleStyleSheet()
+    
+    elements = [
+        Paragraph(f"{TITLE} - {month}/{year}", styles['Title']),
+        Spacer(1, 0.5*cm),
+        month_table(transactions),
+    ]
+    doc.build(elements)
+    
+    return buffer.getvalue()
+
+
+def render_range_pdf(path: str, title: str, months: list, report: dict):
+    """Write a multi-month export to path: one section per month, then a summary page.
+
+    months is a list of (month_key, transactions); report holds the
+    account_totals and monthly_totals of the yearly report for the range.
+    """
+    doc = SimpleDocTemplate(path, pagesize=A4)
+    styles = getSampleStyleSheet()
+    elements = [Paragraph(f"{TITLE} - {title}", styles['Title'])]
+    
+    for month_key, transactions in months:
+        year, month = month_key.split('-')
+        elements.append(Paragraph(f"{int(month)}/{year}", styles['Heading2']))
+        elements.append(month_table(transactions))
+        elements.append(PageBreak())
+    
+    # Summary page
+    elements.append(Paragraph(f"Abschluss {title}", styles['Title']))
+    elements.append(Paragraph("Konten", styles['Heading2']))
+    account_data = [['Konto', 'Einnahmen', 'Ausgaben']]
+    for account_name, totals in sorted(report['account_totals'].items()):
+        account_data.append([account_name[:40], f"{totals['income']:.2f}", f"{totals['expense']:.2f}"])
+    total_income = sum(t['income'] for t in report['monthly_totals'].values())
+    total_expense = sum(t['expense'] for t in report['monthly_totals'].values())
+    account_data.append(['Total:', f"{total_income:.2f}", f"{total_expense:.2f}"])
+    account_table = Table(account_data, colWidths=[9*cm, 4*cm, 4*cm])
+    account_table.setStyle(SUMMARY_STYLE)
+    elements.append(account_table)
+    
+    elements.append(Spacer(1, 0.5*cm))
+    elements.append(Paragraph("Monate", styles['Heading2']))
+    monthly_data = [['Monat', 'Einnahmen', 'Ausgaben', 'Einkommen']]
+    for month_key, totals in sorted(report['monthly_totals'].items()):
+        monthly_data.append([month_key, f"{totals['income']:.2f}", f"{totals['expense']:.2f}", f"{totals['total']:.2f}"])
+    monthly_data.append(['Total:', f"{total_income:.2f}", f"{total_expense:.2f}", f"{total_income - total_expense:.2f}"])
+    monthly_table = Table(monthly_data, colWidths=[5*cm, 4*cm, 4*cm, 4*cm])
+    monthly_table.setStyle(SUMMARY_STYLE)
+    elements.append(monthly_table)
+    
+    doc.build(elements)
@@ -0,0 +1,14 @@
+import asyncio
+from server import client, rebuild_monthly_summaries
+
+async def rebuild():
+    count = await rebuild_monthly_summaries()
+    if count is None:
+        print("Another rebuild is running, try again later")
+    else:
+        print(f"Rebuilt {count} monthly summaries from transactions")
+    
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(rebuild())
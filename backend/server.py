@@ -1,39 +1,100 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Query, Header
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Query, Header, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse, ORJSONResponse
+from fastapi.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
+from pymongo import ReturnDocument, UpdateOne, InsertOne, DeleteOne, DeleteMany
+from pymongo.errors import PyMongoError, BulkWriteError, DuplicateKeyError
+from pydantic import BaseModel, Field, ConfigDict, ValidationError, model_validator
 from typing import List, Optional
 import uuid
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 import bcrypt
 import jwt
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.units import cm
-import io
+import multiprocessing
+import re
+import hashlib
+import base64
+import json
+import orjson
+import mimetypes
 import shutil
+import subprocess
+from PIL import Image, ImageOps
+import tempfile
+from starlette.background import BackgroundTask
+import csv
+import xml.etree.ElementTree as ET
+from pdf_export import render_month_pdf, render_range_pdf
+from bank_import import parse_statement
+import asyncio
+import contextlib
+import functools
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# Datetimes are stored as BSON dates and read back as aware UTC datetimes
+client = AsyncIOMotorClient(mongo_url, tz_aware=True)
 db = client[os.environ['DB_NAME']]
 
 # JWT Secret
 JWT_SECRET = os.environ.get('JWT_SECRET', 'saferide-secret-key-2024')
 
+# Seconds a freshly issued token's claims are trusted without loading the user
+TOKEN_CLAIMS_TTL = float(os.environ.get('TOKEN_CLAIMS_TTL', '900'))
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', '256'))
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', '60'))
+# Seconds a worker may go without reloading revocations written by other workers;
+# a deleted user's fresh token keeps working on those workers for at most this long
+REVOCATION_REFRESH = float(os.environ.get('REVOCATION_REFRESH', '5'))
+
+# Threads reserved for bcrypt so password checks never run on the event loop
+HASH_WORKERS = int(os.environ.get('HASH_WORKERS', '2'))
+
+# Worker processes for reportlab and the seconds an export may take
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', '2'))
+PDF_TIMEOUT = float(os.environ.get('PDF_TIMEOUT', '60'))
+# Longest range export; a render cannot be interrupted and holds its worker until done
+PDF_RANGE_MAX_MONTHS = int(os.environ.get('PDF_RANGE_MAX_MONTHS', '24'))
+
+# Seconds a prefetched dashboard payload stays usable
+DASHBOARD_PREFETCH_TTL = float(os.environ.get('DASHBOARD_PREFETCH_TTL', '30'))
+
+# Seconds before a worker re-reads the account catalogue written by other workers
+ACCOUNT_CACHE_TTL = float(os.environ.get('ACCOUNT_CACHE_TTL', '60'))
+
 # Upload directory
 UPLOAD_DIR = ROOT_DIR / 'uploads'
 UPLOAD_DIR.mkdir(exist_ok=True)
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', str(25 * 1024 * 1024)))
+# Whole request bodies, checked before multipart parsing spools them to disk
+MAX_REQUEST_BYTES = int(os.environ.get('MAX_REQUEST_BYTES', str(MAX_UPLOAD_BYTES + 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Resized variants of uploaded images and PDFs, served via /api/files/{name}?size=
+PREVIEW_DIR = UPLOAD_DIR / 'previews'
+PREVIEW_DIR.mkdir(exist_ok=True)
+PREVIEW_SIZES = (200, 1024)
+PREVIEW_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'webp', 'bmp', 'tif', 'tiff', 'pdf'}
+
+# Rendered month exports, named saferide_YYYY_MM_<content hash>.pdf
+PDF_CACHE_DIR = ROOT_DIR / 'pdf_cache'
+PDF_CACHE_DIR.mkdir(exist_ok=True)
+
+# Responses above this size are gzip-compressed; files and PDF exports are sent as they are
+GZIP_MINIMUM_SIZE = int(os.environ.get('GZIP_MINIMUM_SIZE', '1024'))
+UNCOMPRESSED_PATHS = ("/api/files/", "/api/reports/export-pdf")
 
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
@@ -45,6 +106,7 @@ class User(BaseModel):
     username: str
     role: str  # 'admin' or 'user'
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class UserCreate(BaseModel):
     username: str
@@ -61,6 +123,7 @@ class Account(BaseModel):
     name: str
     type: str  # 'income' or 'expense'
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class AccountCreate(BaseModel):
     name: str
@@ -81,6 +144,7 @@ class Transaction(BaseModel):
     file_url: Optional[str] = None
     user_id: str
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class TransactionCreate(BaseModel):
     date: str
@@ -92,6 +156,34 @@ class TransactionCreate(BaseModel):
     payment_method: Optional[str] = None
     remarks: Optional[str] = None
 
+class TransactionPatch(BaseModel):
+    date: Optional[str] = None
+    description: Optional[str] = None
+    type: Optional[str] = None
+    amount: Optional[float] = None
+    account_id: Optional[str] = None
+    customer_id: Optional[str] = None
+    payment_method: Optional[str] = None
+    remarks: Optional[str] = None
+    
+    @model_validator(mode='after')
+    def required_fields_not_null(self):
+        # Omitting a field leaves it unchanged; null would blank a required field
+        nulls = [name for name in ('date', 'description', 'type', 'amount', 'account_id')
+                 if name in self.model_fields_set and getattr(self, name) is None]
+        if nulls:
+            raise ValueError(f"{', '.join(nulls)} cannot be null")
+        return self
+
+class TransactionBatchOperation(BaseModel):
+    op: str  # 'create', 'update' or 'delete'
+    id: Optional[str] = None  # Required for update and delete
+    data: Optional[dict] = None  # TransactionCreate for create, TransactionPatch for update
+
+class TransactionBatch(BaseModel):
+    operations: List[TransactionBatchOperation] = Field(max_length=1000)
+    atomic: bool = False  # All-or-nothing; needs a MongoDB replica set
+
 class BankDocument(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -101,6 +193,7 @@ class BankDocument(BaseModel):
     filename: Optional[str] = None
     user_id: str
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class BankDocumentCreate(BaseModel):
     date: str
@@ -116,6 +209,7 @@ class MiscItem(BaseModel):
     filename: Optional[str] = None
     user_id: str
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class MiscItemCreate(BaseModel):
     date: str
@@ -130,6 +224,7 @@ class ImportantUpload(BaseModel):
     file_url: Optional[str] = None
     user_id: str
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 
 class MonthLock(BaseModel):
@@ -165,6 +260,7 @@ class Vehicle(BaseModel):
     fahrzeugausweis_url: Optional[str] = None
     images: Optional[list] = []
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class VehicleCreate(BaseModel):
     marke: str
@@ -195,6 +291,7 @@ class ServiceEntry(BaseModel):
     km_stand: int
     file_url: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class ServiceEntryCreate(BaseModel):
     vehicle_id: str
@@ -214,6 +311,7 @@ class Customer(BaseModel):
     email: str
     active: bool = True
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class CustomerCreate(BaseModel):
     name: str
@@ -233,13 +331,132 @@ class CustomerRemark(BaseModel):
     remarks: str
     file_url: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class CustomerRemarkCreate(BaseModel):
     customer_id: str
     date: str
     remarks: str
 
+class ImportRule(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    pattern: str  # Case-insensitive text searched in the booking description
+    account_id: str
+    type: Optional[str] = None  # Only match 'income' or 'expense' bookings
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class ImportRuleCreate(BaseModel):
+    pattern: str
+    account_id: str
+    type: Optional[str] = None
+
 # Auth helpers
+class UserCache:
+    """Bounded LRU of user records plus a deny list of deleted users.
+
+    The deny list lives in the revoked_users collection so every worker sees
+    it; each worker keeps a copy that is reloaded every REVOCATION_REFRESH seconds.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._users = OrderedDict()
+        self._revoked = set()
+        self._revoked_loaded_at = None
+
+    def get(self, user_id: str) -> Optional[dict]:
+        entry = self._users.get(user_id)
+        if entry is None:
+            return None
+        user, cached_at = entry
+        if time.monotonic() - cached_at > self.ttl:
+            del self._users[user_id]
+            return None
+        self._users.move_to_end(user_id)
+        return user
+
+    def put(self, user: dict):
+        self._users[user['id']] = (user, time.monotonic())
+        self._users.move_to_end(user['id'])
+        while len(self._users) > self.maxsize:
+            self._users.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        self._users.pop(user_id, None)
+
+    async def revoke(self, user_id: str):
+        self.invalidate(user_id)
+        self._revoked.add(user_id)
+        await db.revoked_users.update_one(
+            {"id": user_id},
+            {"$set": {"revoked_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+
+    async def is_revoked(self, user_id: str) -> bool:
+        if self._revoked_loaded_at is None or time.monotonic() - self._revoked_loaded_at > REVOCATION_REFRESH:
+            revoked = await db.revoked_users.find({}, {"_id": 0, "id": 1}).to_list(None)
+            self._revoked = {entry['id'] for entry in revoked}
+            self._revoked_loaded_at = time.monotonic()
+        return user_id in self._revoked
+
+user_cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+class PoolMetrics:
+    """Counters for work handed to an executor: queue wait and backlog."""
+
+    def __init__(self):
+        self.completed = 0
+        self.pending = 0
+        self.queue_seconds_total = 0.0
+        self.queue_seconds_max = 0.0
+
+    def record_wait(self, seconds: float):
+        self.queue_seconds_total += seconds
+        self.queue_seconds_max = max(self.queue_seconds_max, seconds)
+
+    def snapshot(self) -> dict:
+        return {
+            "completed": self.completed,
+            "pending": self.pending,
+            "queue_seconds_avg": self.queue_seconds_total / self.completed if self.completed else 0.0,
+            "queue_seconds_max": self.queue_seconds_max,
+        }
+
+hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='bcrypt')
+hash_semaphore = asyncio.Semaphore(HASH_WORKERS)
+hash_metrics = PoolMetrics()
+
+async def run_in_hash_pool(func, *args):
+    # Wait for a free worker here rather than in the executor queue so the wait is measured
+    queued_at = time.monotonic()
+    hash_metrics.pending += 1
+    try:
+        async with hash_semaphore:
+            hash_metrics.record_wait(time.monotonic() - queued_at)
+            result = await asyncio.get_running_loop().run_in_executor(hash_executor, func, *args)
+            hash_metrics.completed += 1
+            return result
+    finally:
+        hash_metrics.pending -= 1
+
+async def hash_password(password: str) -> str:
+    password_hash = await run_in_hash_pool(bcrypt.hashpw, password.encode(), bcrypt.gensalt())
+    return password_hash.decode()
+
+async def check_password(password: str, password_hash: str) -> bool:
+    return await run_in_hash_pool(bcrypt.checkpw, password.encode(), password_hash.encode())
+
+def create_token(user: dict) -> str:
+    return jwt.encode(
+        {"user_id": user['id'], "username": user['username'], "role": user['role'], "iat": int(time.time())},
+        JWT_SECRET,
+        algorithm='HS256'
+    )
+
 def verify_token(token: str) -> dict:
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
@@ -253,13 +470,260 @@ async def get_current_user(authorization: Optional[str] = Header(None)) -> dict:
     
     token = authorization.replace('Bearer ', '')
     payload = verify_token(token)
-    user = await db.users.find_one({"id": payload['user_id']}, {"_id": 0})
+    user_id = payload['user_id']
+    
+    if await user_cache.is_revoked(user_id):
+        raise HTTPException(status_code=401, detail="User not found")
+    
+    # Fresh tokens carry everything the routes need
+    issued_at = payload.get('iat')
+    if issued_at is not None and time.time() - issued_at < TOKEN_CLAIMS_TTL:
+        return {"id": user_id, "username": payload['username'], "role": payload['role']}
+    
+    user = user_cache.get(user_id)
+    if user:
+        return user
+    
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0})
     
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
     
+    user_cache.put(user)
     return user
 
+# Query helpers
+def date_range_query(year: int, month: Optional[int] = None) -> dict:
+    """Filter on the YYYY-MM-DD date string as an index-bounded range."""
+    if month:
+        start = f"{year}-{month:02d}"
+        end = f"{year + 1}-01" if month == 12 else f"{year}-{month + 1:02d}"
+    else:
+        start = f"{year}"
+        end = f"{year + 1}"
+    return {"date": {"$gte": start, "$lt": end}}
+
+def next_month(month_key: str) -> str:
+    year, month = (int(part) for part in month_key.split('-'))
+    return f"{year + 1}-01" if month == 12 else f"{year}-{month + 1:02d}"
+
+def month_range(start: str, end: str) -> List[str]:
+    """All 'YYYY-MM' keys from start to end inclusive."""
+    month_keys = []
+    month_key = start
+    while month_key <= end:
+        month_keys.append(month_key)
+        month_key = next_month(month_key)
+    return month_keys
+
+# Amounts are summed as integer Rappen so yearly totals carry no float drift.
+# Transactions written before migrate_schema.py ran only have the float 'amount'.
+def to_rappen(amount: float) -> int:
+    return int(round(amount * 100))
+
+def transaction_rappen(trans: dict) -> int:
+    rappen = trans.get('amount_rappen')
+    return to_rappen(trans['amount']) if rappen is None else rappen
+
+# Same fallback inside an aggregation pipeline
+RAPPEN_EXPR = {"$ifNull": ["$amount_rappen", {"$round": [{"$multiply": ["$amount", 100]}, 0]}]}
+
+# Lean list responses
+# The big list routes return Mongo rows, projected to the model's fields, as
+# they are: validating thousands of trusted rows against response_model and
+# re-encoding them costs more than the query. response_model stays on those
+# routes for the OpenAPI schema.
+class FastJSONResponse(ORJSONResponse):
+    def render(self, content) -> bytes:
+        # UTC as 'Z', like pydantic
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+def model_projection(model) -> dict:
+    return {"_id": 0, **{name: 1 for name in model.model_fields}}
+
+def fields_projection(model, fields: Optional[str], required=("id",)) -> dict:
+    """model_projection narrowed to a comma-separated fields= list.
+
+    The required fields are always returned; unknown names are a 400.
+    """
+    if not fields:
+        return model_projection(model)
+    requested = {name.strip() for name in fields.split(',') if name.strip()}
+    unknown = requested - set(model.model_fields)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return {"_id": 0, **{name: 1 for name in requested.union(required)}}
+
+# Collection versions
+# Counters bumped after every write, per collection and per transaction month
+# ('transactions:YYYY-MM'). List and report routes turn them into a weak ETag
+# and answer a matching If-None-Match with 304 before reading any documents.
+VERSION_CACHE_CONTROL = "private, no-cache"
+
+async def bump_versions(*keys: str):
+    await db.versions.bulk_write([
+        UpdateOne({"key": key}, {"$inc": {"version": 1}}, upsert=True)
+        for key in set(keys)
+    ], ordered=False)
+
+async def bump_transaction_versions(*month_keys: str):
+    """Transactions changed in these months; the unfiltered list changes with them."""
+    await bump_versions("transactions", *(f"transactions:{month_key}" for month_key in month_keys))
+
+@contextlib.asynccontextmanager
+async def transaction_write(*month_keys: str):
+    """Wrap a write to transactions and their monthly summaries.
+
+    Marks the months as pending before the write and clears the marks on
+    exit, bumping their versions like bump_transaction_versions. A summary
+    rebuild waits for marked months (see rebuild_monthly_summaries). Yields
+    the set of months; months added to it during the write are bumped too.
+    """
+    marked = set(month_keys)
+    months = set(marked)
+    if marked:
+        await db.versions.bulk_write([
+            UpdateOne({"key": f"transactions:{month_key}"}, {"$inc": {"pending": 1}}, upsert=True)
+            for month_key in marked
+        ], ordered=False)
+    try:
+        yield months
+    finally:
+        if months:
+            await db.versions.bulk_write([
+                UpdateOne({"key": "transactions"}, {"$inc": {"version": 1}}, upsert=True),
+                *(
+                    UpdateOne({"key": f"transactions:{month_key}"}, {"$inc": {"version": 1, "pending": -1 if month_key in marked else 0}}, upsert=True)
+                    for month_key in months
+                ),
+            ], ordered=False)
+
+async def versions_etag(*keys: str) -> str:
+    docs = await db.versions.find({"key": {"$in": list(keys)}}, {"_id": 0}).to_list(None)
+    versions = {doc['key']: doc.get('version', 0) for doc in docs}
+    # Bodies built from the account cache must be at least as new as the ETag
+    if "accounts" in versions:
+        account_cache.require_version(versions["accounts"])
+    return 'W/"' + '.'.join(str(versions.get(key, 0)) for key in keys) + '"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match check, with the weak comparison RFC 9110 asks for."""
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    return etag.removeprefix('W/') in [t.strip().removeprefix('W/') for t in if_none_match.split(',')]
+
+def version_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": VERSION_CACHE_CONTROL}
+
+# Delta sync
+# Every write stamps updated_at and deletes leave a tombstone. A full list
+# carries an X-Sync-Token; passing it back as since= returns only the rows
+# changed and the ids deleted after it, plus the next token.
+SYNC_TOMBSTONE_DAYS = int(os.environ.get('SYNC_TOMBSTONE_DAYS', '90'))
+# Re-send a little history: a write stamped just before a sync may commit after it
+SYNC_OVERLAP = timedelta(seconds=5)
+
+def sync_token(moment: datetime) -> str:
+    return str(int(moment.timestamp() * 1000))
+
+def parse_sync_token(token: str) -> datetime:
+    try:
+        return datetime.fromtimestamp(int(token) / 1000, tz=timezone.utc)
+    except (ValueError, OverflowError, OSError):
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+
+async def record_tombstones(collection: str, ids: List[str], session=None):
+    if ids:
+        deleted_at = datetime.now(timezone.utc)
+        await db.tombstones.insert_many(
+            [{"collection": collection, "id": entity_id, "deleted_at": deleted_at} for entity_id in ids],
+            session=session
+        )
+
+async def delta_sync(collection: str, projection: dict, since: str) -> dict:
+    """Rows changed and ids deleted since the token, with the token to use next."""
+    started = datetime.now(timezone.utc)
+    since_at = parse_sync_token(since)
+    # Tombstones older than this are gone, so deletes could be missed
+    if since_at < started - timedelta(days=SYNC_TOMBSTONE_DAYS):
+        raise HTTPException(status_code=410, detail="Sync token expired, reload the full list")
+    
+    window = {"$gte": since_at - SYNC_OVERLAP}
+    changed, deleted = await asyncio.gather(
+        db[collection].find({"updated_at": window}, projection).to_list(None),
+        db.tombstones.find({"collection": collection, "deleted_at": window}, {"_id": 0, "id": 1}).to_list(None),
+    )
+    return {"changed": changed, "deleted": [tombstone['id'] for tombstone in deleted], "token": sync_token(started)}
+
+# Account cache
+class AccountCache:
+    """In-process copy of the accounts collection, keyed by id and by name.
+
+    Account write routes refresh it immediately. Changes made through other
+    uvicorn workers are picked up by the TTL, or as soon as a request reads a
+    newer 'accounts' version than the one the cache was loaded under.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.by_id = {}
+        self.by_name = {}
+        self.loaded_at = None
+        self.version = 0
+        self.required_version = 0
+        self._lock = asyncio.Lock()
+
+    def _is_stale(self) -> bool:
+        return (
+            self.loaded_at is None
+            or time.monotonic() - self.loaded_at > self.ttl
+            or self.version < self.required_version
+        )
+
+    async def refresh(self):
+        # Read the version first: the accounts loaded after it are at least that new
+        version_doc = await db.versions.find_one({"key": "accounts"}, {"_id": 0, "version": 1})
+        accounts = await db.accounts.find({}, {"_id": 0}).to_list(None)
+        self.by_id = {account['id']: account for account in accounts}
+        self.by_name = {account['name']: account for account in accounts}
+        self.version = version_doc['version'] if version_doc else 0
+        self.loaded_at = time.monotonic()
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    def require_version(self, version: int):
+        """A request saw this 'accounts' version; reload before serving anything older."""
+        self.required_version = max(self.required_version, version)
+
+    async def _ensure_fresh(self):
+        if self._is_stale():
+            async with self._lock:
+                if self._is_stale():
+                    await self.refresh()
+
+    async def all(self) -> List[dict]:
+        await self._ensure_fresh()
+        return sorted((dict(a) for a in self.by_id.values()), key=lambda a: a['name'])
+
+    async def get(self, account_id: str) -> Optional[dict]:
+        await self._ensure_fresh()
+        return self.by_id.get(account_id)
+
+    async def get_by_name(self, name: str) -> Optional[dict]:
+        await self._ensure_fresh()
+        return self.by_name.get(name)
+
+    async def names(self) -> dict:
+        """Map of account id to account name."""
+        await self._ensure_fresh()
+        return {account_id: account['name'] for account_id, account in self.by_id.items()}
+
+account_cache = AccountCache(ACCOUNT_CACHE_TTL)
+
 # Auth routes
 @api_router.post("/auth/register")
 async def register(user_data: UserCreate):
@@ -269,13 +733,12 @@ async def register(user_data: UserCreate):
         raise HTTPException(status_code=400, detail="Username already exists")
     
     # Hash password
-    password_hash = bcrypt.hashpw(user_data.password.encode(), bcrypt.gensalt()).decode()
+    password_hash = await hash_password(user_data.password)
     
     # Create user
     user = User(username=user_data.username, role=user_data.role)
     user_dict = user.model_dump()
     user_dict['password_hash'] = password_hash
-    user_dict['created_at'] = user_dict['created_at'].isoformat()
     
     await db.users.insert_one(user_dict)
     
@@ -289,11 +752,11 @@ async def login(credentials: UserLogin):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Verify password
-    if not bcrypt.checkpw(credentials.password.encode(), user['password_hash'].encode()):
+    if not await check_password(credentials.password, user['password_hash']):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Generate token
-    token = jwt.encode({"user_id": user['id'], "username": user['username'], "role": user['role']}, JWT_SECRET, algorithm='HS256')
+    token = create_token(user)
     
     return {
         "token": token,
@@ -306,12 +769,13 @@ async def login(credentials: UserLogin):
 
 # Account routes
 @api_router.get("/accounts", response_model=List[Account])
-async def get_accounts():
-    accounts = await db.accounts.find({}, {"_id": 0}).sort("name", 1).to_list(1000)
-    for account in accounts:
-        if isinstance(account.get('created_at'), str):
-            account['created_at'] = datetime.fromisoformat(account['created_at'])
-    return accounts
+async def get_accounts(request: Request):
+    etag = await versions_etag("accounts")
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=version_headers(etag))
+    
+    accounts = await account_cache.all()
+    return FastJSONResponse(accounts, headers=version_headers(etag))
 
 @api_router.post("/accounts", response_model=Account)
 async def create_account(account_data: AccountCreate, user: dict = Depends(get_current_user)):
@@ -320,9 +784,10 @@ async def create_account(account_data: AccountCreate, user: dict = Depends(get_c
     
     account = Account(name=account_data.name, type=account_data.type)
     account_dict = account.model_dump()
-    account_dict['created_at'] = account_dict['created_at'].isoformat()
     
     await db.accounts.insert_one(account_dict)
+    await bump_versions("accounts")
+    await account_cache.refresh()
     return account
 
 
@@ -332,14 +797,15 @@ async def update_account(account_id: str, account_data: AccountCreate, user: dic
         raise HTTPException(status_code=403, detail="Only admins can update accounts")
     
     update_data = account_data.model_dump()
-    result = await db.accounts.update_one({"id": account_id}, {"$set": update_data})
+    result = await db.accounts.update_one({"id": account_id}, {"$set": {**update_data, "updated_at": datetime.now(timezone.utc)}})
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Account not found")
     
-    updated_account = await db.accounts.find_one({"id": account_id}, {"_id": 0})
-    if isinstance(updated_account.get('created_at'), str):
-        updated_account['created_at'] = datetime.fromisoformat(updated_account['created_at'])
+    await bump_versions("accounts")
+    await account_cache.refresh()
+    invalidate_pdf_cache()
+    updated_account = dict(await account_cache.get(account_id))
     
     return Account(**updated_account)
 
@@ -352,28 +818,250 @@ async def delete_account(account_id: str, user: dict = Depends(get_current_user)
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Account not found")
     
+    await bump_versions("accounts")
+    await account_cache.refresh()
     return {"message": "Account deleted successfully"}
 
+# Ledger summaries
+async def aggregate_ledger(query: dict) -> List[dict]:
+    """Sum transaction amounts per month, account, type and payment method on the server.
+
+    Returns one row per group: {'month': 'YYYY-MM', 'account_id', 'type',
+    'payment_method', 'amount_rappen', 'count'}.
+    """
+    pipeline = [
+        {"$match": query},
+        {"$project": {"_id": 0, "date": 1, "account_id": 1, "type": 1, "payment_method": 1, "amount": 1, "amount_rappen": 1}},
+        {"$group": {
+            "_id": {
+                "month": {"$substr": ["$date", 0, 7]},
+                "account_id": "$account_id",
+                "type": "$type",
+                "payment_method": "$payment_method",
+            },
+            "amount_rappen": {"$sum": RAPPEN_EXPR},
+            "count": {"$sum": 1},
+        }},
+    ]
+    groups = await db.transactions.aggregate(pipeline).to_list(None)
+    return [{**group['_id'], 'amount_rappen': int(group['amount_rappen']), 'count': group['count']} for group in groups]
+
+def summary_key(trans: dict) -> dict:
+    return {
+        "month": trans['date'][:7],
+        "account_id": trans['account_id'],
+        "type": trans['type'],
+        "payment_method": trans.get('payment_method'),
+    }
+
+async def apply_to_summary(trans: dict, sign: int = 1):
+    """Add (sign=1) or remove (sign=-1) a transaction from monthly_summaries."""
+    key = summary_key(trans)
+    await db.monthly_summaries.update_one(
+        key,
+        {"$inc": {"amount_rappen": sign * transaction_rappen(trans), "count": sign}},
+        upsert=True
+    )
+    if sign < 0:
+        await db.monthly_summaries.delete_one({**key, "count": {"$lte": 0}})
+
+async def apply_many_to_summary(transactions: List[dict], sign: int = 1, session=None):
+    """apply_to_summary for many transactions with one bulk write."""
+    increments = {}
+    for trans in transactions:
+        key = tuple(summary_key(trans).items())
+        amount, count = increments.get(key, (0, 0))
+        increments[key] = (amount + sign * transaction_rappen(trans), count + sign)
+    if not increments:
+        return
+    await db.monthly_summaries.bulk_write([
+        UpdateOne(dict(key), {"$inc": {"amount_rappen": amount, "count": count}}, upsert=True)
+        for key, (amount, count) in increments.items()
+    ], ordered=False, session=session)
+    if sign < 0:
+        await db.monthly_summaries.delete_many({"count": {"$lte": 0}}, session=session)
+
+SUMMARY_KEY_INDEX = [("month", 1), ("account_id", 1), ("type", 1), ("payment_method", 1)]
+# A rebuild that dies without releasing its lock frees it after this many seconds
+REBUILD_LOCK_TTL = 600
+# Seconds a rebuild waits for a month's pending writes before recomputing it anyway;
+# a mark only outlives its write if the worker died in the middle of it
+REBUILD_SETTLE_TIMEOUT = 30
+
+async def acquire_lock(name: str, ttl: float) -> Optional[str]:
+    """Take the named lock document; returns its token, or None while someone else holds it."""
+    token = str(uuid.uuid4())
+    now = datetime.now(timezone.utc)
+    try:
+        # Matches an expired lock or inserts a new one; a held lock makes the insert a duplicate
+        await db.locks.update_one(
+            {"id": name, "expires_at": {"$lt": now}},
+            {"$set": {"token": token, "expires_at": now + timedelta(seconds=ttl)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return None
+    return token
+
+async def release_lock(name: str, token: str):
+    await db.locks.delete_one({"id": name, "token": token})
+
+async def transaction_month_versions() -> dict:
+    """Map of 'transactions:YYYY-MM' to (version, writes pending)."""
+    versions = await db.versions.find({"key": {"$regex": "^transactions:"}}, {"_id": 0}).to_list(None)
+    return {entry['key']: (entry.get('version', 0), entry.get('pending', 0)) for entry in versions}
+
+async def rebuild_month_summaries(month_key: str):
+    """Overwrite one month's summary rows with totals read from the ledger."""
+    year, month = (int(part) for part in month_key.split('-'))
+    groups = await aggregate_ledger(date_range_query(year, month))
+    requests = [
+        UpdateOne(
+            {key: group.get(key) for key, _ in SUMMARY_KEY_INDEX},
+            {"$set": {"amount_rappen": group['amount_rappen'], "count": group['count']}},
+            upsert=True
+        )
+        for group in groups
+    ]
+    present = [{key: group.get(key) for key, _ in SUMMARY_KEY_INDEX} for group in groups]
+    requests.append(DeleteMany({"month": month_key, "$nor": present} if present else {"month": month_key}))
+    await db.monthly_summaries.bulk_write(requests, ordered=False)
+
+async def rebuild_monthly_summaries() -> Optional[int]:
+    """Recompute monthly_summaries from the transactions collection.
+
+    Builds into a scratch collection that is renamed over the live one, under
+    a lock so only one worker or script rebuilds at a time. A write racing the
+    rebuild can put its increment in the replaced collection, or into the new
+    one on top of a ledger read that already counted it. Writes mark their
+    months pending before they start (transaction_write), so after the rename
+    every month changed or pending since the snapshot is recomputed once its
+    writes are done, until a pass finds all months settled and unchanged.
+    Returns the number of summary rows, or None when another rebuild holds
+    the lock.
+    """
+    token = await acquire_lock("rebuild_monthly_summaries", REBUILD_LOCK_TTL)
+    if token is None:
+        return None
+    try:
+        versions_before = await transaction_month_versions()
+        groups = await aggregate_ledger({})
+        
+        scratch = db.monthly_summaries_rebuild
+        await scratch.drop()
+        await scratch.create_index(SUMMARY_KEY_INDEX, unique=True)
+        if groups:
+            await scratch.insert_many([{**group, 'payment_method': group.get('payment_method')} for group in groups])
+        await scratch.rename("monthly_summaries", dropTarget=True)
+        
+        seen = versions_before
+        deadline = time.monotonic() + REBUILD_SETTLE_TIMEOUT
+        while True:
+            waiting = time.monotonic() < deadline
+            current = await transaction_month_versions()
+            changed = {
+                key: state for key, state in current.items()
+                if state != seen.get(key) or (waiting and state[1] > 0)
+            }
+            if not changed:
+                break
+            for key, state in changed.items():
+                if state[1] > 0 and waiting:
+                    continue
+                if state[1] > 0:
+                    logger.warning("Recomputing %s with %d writes still marked pending", key, state[1])
+                await rebuild_month_summaries(key.split(':', 1)[1])
+                seen[key] = state
+            if any(state[1] > 0 for state in changed.values()) and waiting:
+                await asyncio.sleep(0.1)
+        return len(groups)
+    finally:
+        await release_lock("rebuild_monthly_summaries", token)
+
+async def get_ledger_summaries(start: str, end: str) -> List[dict]:
+    """Summary rows (month, account, type, payment method) for the months start..end inclusive."""
+    return await db.monthly_summaries.find(
+        {"month": {"$gte": start, "$lte": end}},
+        {"_id": 0}
+    ).to_list(None)
+
 # Transaction routes
+# Lists are ordered newest first by (date, id); a cursor encodes the last row returned
+def encode_cursor(trans: dict) -> str:
+    return base64.urlsafe_b64encode(f"{trans['date']}|{trans['id']}".encode()).decode()
+
+def decode_cursor(cursor: str) -> dict:
+    """Filter for the rows that come after the cursor."""
+    try:
+        date, trans_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"$or": [{"date": {"$lt": date}}, {"date": date, "id": {"$lt": trans_id}}]}
+
+async def stream_transactions_ndjson(cursor, account_names: dict):
+    async for trans in cursor:
+        if trans['account_id'] in account_names:
+            trans['account_name'] = account_names[trans['account_id']]
+        yield orjson.dumps(trans, option=orjson.OPT_UTC_Z) + b"\n"
+
 @api_router.get("/transactions", response_model=List[Transaction])
-async def get_transactions(year: int = None, month: int = None, user: dict = Depends(get_current_user)):
+async def get_transactions(
+    request: Request,
+    year: int = None,
+    month: int = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    after: Optional[str] = None,
+    format: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+    fields: Optional[str] = None,
+    since: Optional[str] = None,
+    user: dict = Depends(get_current_user)
+):
+    if since and (year or month or after or limit or format):
+        raise HTTPException(status_code=400, detail="since cannot be combined with year, month, after, limit or format")
+    
+    # Account names are part of every row
+    etag = await versions_etag(f"transactions:{year}-{month:02d}" if year and month else "transactions", "accounts")
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=version_headers(etag))
+    
     query = {}
     if year and month:
         # Filter by year and month
-        query = {"date": {"$regex": f"^{year}-{month:02d}"}}
-    
-    transactions = await db.transactions.find(query, {"_id": 0}).sort("date", -1).to_list(10000)
+        query = date_range_query(year, month)
+    if after:
+        query = {"$and": [query, decode_cursor(after)]}
+    
+    # date and account_id back the cursor and the account names
+    projection = fields_projection(Transaction, fields, required=("id", "date", "account_id"))
+    account_names = await account_cache.names() if "account_name" in projection else {}
+    
+    if since:
+        delta = await delta_sync("transactions", projection, since)
+        for trans in delta['changed']:
+            if trans['account_id'] in account_names:
+                trans['account_name'] = account_names[trans['account_id']]
+        return FastJSONResponse(delta, headers=version_headers(etag))
+    
+    synced_at = datetime.now(timezone.utc)
+    cursor = db.transactions.find(query, projection).sort([("date", -1), ("id", -1)])
+    if limit:
+        cursor = cursor.limit(limit)
+    
+    # NDJSON streams straight from the Motor cursor, one transaction per line
+    if format == "ndjson":
+        return StreamingResponse(stream_transactions_ndjson(cursor, account_names), media_type="application/x-ndjson", headers=version_headers(etag))
+    
+    transactions = await cursor.to_list(None)
+    headers = {**version_headers(etag), "X-Sync-Token": sync_token(synced_at)}
+    if limit and len(transactions) == limit:
+        headers["X-Next-Cursor"] = encode_cursor(transactions[-1])
     
     # Populate account names
     for trans in transactions:
-        if isinstance(trans.get('created_at'), str):
-            trans['created_at'] = datetime.fromisoformat(trans['created_at'])
-        
-        account = await db.accounts.find_one({"id": trans['account_id']}, {"_id": 0})
-        if account:
-            trans['account_name'] = account['name']
+        if trans['account_id'] in account_names:
+            trans['account_name'] = account_names[trans['account_id']]
     
-    return transactions
+    return FastJSONResponse(transactions, headers=headers)
 
 @api_router.post("/transactions", response_model=Transaction)
 async def create_transaction(transaction_data: TransactionCreate, user: dict = Depends(get_current_user)):
@@ -390,14 +1078,17 @@ async def create_transaction(transaction_data: TransactionCreate, user: dict = D
     )
     
     transaction_dict = transaction.model_dump()
-    transaction_dict['created_at'] = transaction_dict['created_at'].isoformat()
+    transaction_dict['amount_rappen'] = to_rappen(transaction.amount)
     
     # Get account name
-    account = await db.accounts.find_one({"id": transaction_data.account_id}, {"_id": 0})
+    account = await account_cache.get(transaction_data.account_id)
     if account:
         transaction_dict['account_name'] = account['name']
     
-    await db.transactions.insert_one(transaction_dict)
+    async with transaction_write(transaction_dict['date'][:7]):
+        await db.transactions.insert_one(transaction_dict)
+        await apply_to_summary(transaction_dict)
+    invalidate_pdf_cache(transaction_dict['date'][:7])
     
     # If customer_id provided, add remark to customer
     if transaction_data.customer_id:
@@ -407,7 +1098,8 @@ async def create_transaction(transaction_data: TransactionCreate, user: dict = D
             "customer_id": transaction_data.customer_id,
             "date": transaction_data.date,
             "remarks": remark_text,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc),
+            "updated_at": datetime.now(timezone.utc)
         })
     
     return transaction
@@ -415,175 +1107,708 @@ async def create_transaction(transaction_data: TransactionCreate, user: dict = D
 @api_router.put("/transactions/{transaction_id}")
 async def update_transaction(transaction_id: str, transaction_data: TransactionCreate, user: dict = Depends(get_current_user)):
     update_data = transaction_data.model_dump()
+    update_data['amount_rappen'] = to_rappen(transaction_data.amount)
     
     # Get account name
-    account = await db.accounts.find_one({"id": transaction_data.account_id}, {"_id": 0})
+    account = await account_cache.get(transaction_data.account_id)
     if account:
         update_data['account_name'] = account['name']
     
-    result = await db.transactions.update_one({"id": transaction_id}, {"$set": update_data})
-    
-    if result.matched_count == 0:
+    current = await db.transactions.find_one({"id": transaction_id}, {"_id": 0, "date": 1})
+    if current is None:
         raise HTTPException(status_code=404, detail="Transaction not found")
     
+    async with transaction_write(current['date'][:7], update_data['date'][:7]) as month_keys:
+        previous = await db.transactions.find_one_and_update(
+            {"id": transaction_id},
+            {"$set": {**update_data, "updated_at": datetime.now(timezone.utc)}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.BEFORE
+        )
+        if previous is None:
+            raise HTTPException(status_code=404, detail="Transaction not found")
+        # Moved to another month by a concurrent update since it was read
+        month_keys.add(previous['date'][:7])
+        
+        await apply_to_summary(previous, -1)
+        await apply_to_summary({**previous, **update_data})
+    invalidate_pdf_cache(previous['date'][:7])
+    invalidate_pdf_cache(update_data['date'][:7])
+    
     return {"message": "Transaction updated successfully"}
 
 @api_router.delete("/transactions/{transaction_id}")
 async def delete_transaction(transaction_id: str, user: dict = Depends(get_current_user)):
-    result = await db.transactions.delete_one({"id": transaction_id})
-    
-    if result.deleted_count == 0:
+    current = await db.transactions.find_one({"id": transaction_id}, {"_id": 0, "date": 1})
+    if current is None:
         raise HTTPException(status_code=404, detail="Transaction not found")
     
+    async with transaction_write(current['date'][:7]) as month_keys:
+        deleted = await db.transactions.find_one_and_delete({"id": transaction_id}, projection={"_id": 0})
+        if deleted is None:
+            raise HTTPException(status_code=404, detail="Transaction not found")
+        month_keys.add(deleted['date'][:7])
+        
+        await record_tombstones("transactions", [transaction_id])
+        await apply_to_summary(deleted, -1)
+    invalidate_pdf_cache(deleted['date'][:7])
+    await release_uploads("transactions", transaction_id)
+    
     return {"message": "Transaction deleted successfully"}
 
+@api_router.post("/transactions/batch")
+async def batch_transactions(batch: TransactionBatch, user: dict = Depends(get_current_user)):
+    """Create, update and delete many transactions with one bulk_write."""
+    account_names = await account_cache.names()
+    target_ids = [op.id for op in batch.operations if op.op in ('update', 'delete') and op.id]
+    existing = await db.transactions.find({"id": {"$in": target_ids}}, {"_id": 0}).to_list(None)
+    existing = {trans['id']: trans for trans in existing}
+    
+    results = []
+    # One entry per bulk_write request, in order: the transaction it removes
+    # from and adds to the ledger, and the customer remark a create brings
+    writes = []
+    for index, operation in enumerate(batch.operations):
+        result = {"index": index, "op": operation.op, "id": operation.id}
+        results.append(result)
+        try:
+            if operation.op == 'create':
+                transaction_data = TransactionCreate(**(operation.data or {}))
+                transaction = Transaction(**transaction_data.model_dump(), user_id=user['id'])
+                transaction_dict = transaction.model_dump()
+                transaction_dict['amount_rappen'] = to_rappen(transaction.amount)
+                transaction_dict['account_name'] = account_names.get(transaction.account_id)
+                remark = None
+                if transaction.customer_id:
+                    remark = {
+                        "id": str(uuid.uuid4()),
+                        "customer_id": transaction.customer_id,
+                        "date": transaction.date,
+                        "remarks": f"Fahrstunde: {transaction.description} - CHF {transaction.amount}",
+                        "created_at": datetime.now(timezone.utc),
+                        "updated_at": datetime.now(timezone.utc)
+                    }
+                writes.append({"request": InsertOne(transaction_dict), "result": result,
+                               "removed": None, "added": transaction_dict, "remark": remark})
+                result.update(id=transaction.id, status="created")
+            elif operation.op in ('update', 'delete'):
+                previous = existing.get(operation.id)
+                if previous is None:
+                    result.update(status="not_found", error="Transaction not found")
+                    continue
+                if operation.op == 'update':
+                    update_data = TransactionPatch(**(operation.data or {})).model_dump(exclude_unset=True)
+                    if 'amount' in update_data:
+                        update_data['amount_rappen'] = to_rappen(update_data['amount'])
+                    if 'account_id' in update_data:
+                        update_data['account_name'] = account_names.get(update_data['account_id'])
+                    updated = {**previous, **update_data}
+                    existing[operation.id] = updated
+                    writes.append({"request": UpdateOne({"id": operation.id}, {"$set": {**update_data, "updated_at": datetime.now(timezone.utc)}}),
+                                   "result": result, "removed": previous, "added": updated, "remark": None})
+                    result.update(status="updated")
+                else:
+                    del existing[operation.id]
+                    writes.append({"request": DeleteOne({"id": operation.id}), "result": result,
+                                   "removed": previous, "added": None, "remark": None})
+                    result.update(status="deleted")
+            else:
+                result.update(status="error", error="op must be create, update or delete")
+        except ValidationError as e:
+            result.update(status="error", error=str(e.errors()[0]['msg']))
+    
+    failed = [r for r in results if r['status'] in ('error', 'not_found')]
+    if batch.atomic and failed:
+        raise HTTPException(status_code=400, detail={"message": "Batch rejected", "results": results})
+    
+    async def write(session=None) -> list:
+        """Run the writes; returns the ones that were applied."""
+        applied = writes
+        if writes:
+            try:
+                await db.transactions.bulk_write([w['request'] for w in writes], ordered=True, session=session)
+            except BulkWriteError as e:
+                if session is not None:
+                    raise
+                # Ordered: everything before the failing request was applied, nothing after it
+                failed_at = e.details['writeErrors'][0]['index']
+                applied = writes[:failed_at]
+                writes[failed_at]['result'].update(status="error", error=e.details['writeErrors'][0].get('errmsg', "Write failed"))
+                for w in writes[failed_at + 1:]:
+                    w['result'].update(status="error", error="Not applied after an earlier write failed")
+        remarks = [w['remark'] for w in applied if w['remark']]
+        if remarks:
+            await db.customer_remarks.insert_many(remarks, session=session)
+        await record_tombstones("transactions", [w['removed']['id'] for w in applied if w['added'] is None], session=session)
+        await apply_many_to_summary([w['removed'] for w in applied if w['removed']], -1, session=session)
+        await apply_many_to_summary([w['added'] for w in applied if w['added']], session=session)
+        return applied
+    
+    planned_months = {t['date'][:7] for w in writes for t in (w['removed'], w['added']) if t}
+    async with transaction_write(*planned_months):
+        if batch.atomic:
+            try:
+                async with await client.start_session() as session:
+                    async with session.start_transaction():
+                        applied = await write(session)
+            except PyMongoError as e:
+                raise HTTPException(status_code=400, detail=f"Atomic batch failed: {e}")
+        else:
+            applied = await write()
+    
+    month_keys = {t['date'][:7] for w in applied for t in (w['removed'], w['added']) if t}
+    for month_key in month_keys:
+        invalidate_pdf_cache(month_key)
+    for w in applied:
+        if w['added'] is None:
+            await release_uploads("transactions", w['removed']['id'])
+    
+    return {"results": results, "applied": len(applied)}
+
+# Upload service
+# Uploads are stored once per content: the file name is the SHA-256 of the
+# bytes plus the extension. file_blobs counts the references to each stored
+# file and file_refs records which entity field points at it.
+# Claim before place: save_upload counts the reference before the file is
+# moved into place, and gc_uploads.py re-checks the count after taking a file
+# away, so an upload of content that is being collected keeps its file.
+def write_upload(source, target_dir: Path, file_extension: str, max_bytes: int) -> tuple:
+    """Copy an upload to a temp file in chunks while hashing it.
+
+    Returns (temp_path, file_name, digest, size); the caller moves the temp
+    file to target_dir / file_name.
+    """
+    temp_path = target_dir / f".upload_{uuid.uuid4()}.part"
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(temp_path, 'wb') as f:
+            while chunk := source.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail="Datei ist zu gross")
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return temp_path, f"{digest.hexdigest()}.{file_extension}", digest.hexdigest(), size
+
+async def save_upload(file: UploadFile, collection: str, entity_id: str, field: str = 'file_url', replace: bool = True) -> str:
+    """Store an uploaded file off the event loop, reference it from an entity and return its URL.
+
+    With replace=True the entity's previous file in the same field is released.
+    """
+    # Lower-cased so the same bytes as a.JPG and b.jpg share one blob
+    file_extension = re.sub(r'[^A-Za-z0-9]', '', file.filename.split('.')[-1])[:10].lower()
+    temp_path, file_name, digest, size = await run_in_threadpool(write_upload, file.file, UPLOAD_DIR, file_extension, MAX_UPLOAD_BYTES)
+    
+    try:
+        if replace:
+            await release_uploads(collection, entity_id, field)
+        await db.file_blobs.update_one(
+            {"file_name": file_name},
+            {
+                "$inc": {"ref_count": 1},
+                "$setOnInsert": {"digest": digest, "size": size, "created_at": datetime.now(timezone.utc)}
+            },
+            upsert=True
+        )
+        # Same name, same bytes: replacing an existing copy is harmless and
+        # restores one that gc_uploads.py removed just before the claim
+        os.replace(temp_path, UPLOAD_DIR / file_name)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    await db.file_refs.insert_one({"collection": collection, "entity_id": entity_id, "field": field, "file_name": file_name})
+    schedule_previews(file_name)
+    
+    return f"/api/files/{file_name}"
+
+async def release_uploads(collection: str, entity_id: str, field: Optional[str] = None):
+    """Drop an entity's file references; unreferenced files are removed by gc_uploads.py."""
+    query = {"collection": collection, "entity_id": entity_id}
+    if field:
+        query["field"] = field
+    refs = await db.file_refs.find(query, {"_id": 0, "file_name": 1}).to_list(None)
+    if not refs:
+        return
+    await db.file_refs.delete_many(query)
+    for ref in refs:
+        await db.file_blobs.update_one({"file_name": ref['file_name']}, {"$inc": {"ref_count": -1}})
+
+# Bank statement import
+IMPORT_BATCH_SIZE = 500
+
+@api_router.get("/import-rules", response_model=List[ImportRule])
+async def get_import_rules(user: dict = Depends(get_current_user)):
+    rules = await db.import_rules.find({}, {"_id": 0}).sort("created_at", 1).to_list(1000)
+    return rules
+
+@api_router.post("/import-rules", response_model=ImportRule)
+async def create_import_rule(rule_data: ImportRuleCreate, user: dict = Depends(get_current_user)):
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admins can create import rules")
+    
+    rule = ImportRule(**rule_data.model_dump())
+    rule_dict = rule.model_dump()
+    
+    await db.import_rules.insert_one(rule_dict)
+    return rule
+
+@api_router.delete("/import-rules/{rule_id}")
+async def delete_import_rule(rule_id: str, user: dict = Depends(get_current_user)):
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admins can delete import rules")
+    
+    result = await db.import_rules.delete_one({"id": rule_id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Import rule not found")
+    return {"message": "Import rule deleted successfully"}
+
+def read_statement(file_name: str, source) -> list:
+    if source.seek(0, os.SEEK_END) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Datei ist zu gross")
+    source.seek(0)
+    return parse_statement(file_name, source)
+
+@api_router.post("/transactions/import")
+async def import_transactions(
+    file: UploadFile = File(...),
+    dry_run: bool = False,
+    default_income_account_id: Optional[str] = None,
+    default_expense_account_id: Optional[str] = None,
+    payment_method: str = 'bank',
+    user: dict = Depends(get_current_user)
+):
+    """Book a CSV or camt.053 bank statement; accounts come from the import rules or the defaults."""
+    try:
+        bookings = await run_in_threadpool(read_statement, file.filename or '', file.file)
+    except (ValueError, csv.Error, ET.ParseError) as e:
+        raise HTTPException(status_code=400, detail=f"Kontoauszug nicht lesbar: {e}")
+    
+    rules = await db.import_rules.find({}, {"_id": 0}).sort("created_at", 1).to_list(1000)
+    defaults = {'income': default_income_account_id, 'expense': default_expense_account_id}
+    account_names = await account_cache.names()
+    
+    # Bookings imported earlier carry the same import_ref
+    refs = [b['ref'] for b in bookings if 'ref' in b]
+    existing_refs = set()
+    for start in range(0, len(refs), IMPORT_BATCH_SIZE):
+        existing = await db.transactions.find(
+            {"import_ref": {"$in": refs[start:start + IMPORT_BATCH_SIZE]}},
+            {"_id": 0, "import_ref": 1}
+        ).to_list(None)
+        existing_refs.update(t['import_ref'] for t in existing)
+    
+    report = []
+    new_transactions = []
+    for booking in bookings:
+        if 'error' in booking:
+            report.append({"row": booking['row'], "status": "error", "error": booking['error']})
+            continue
+        if booking['ref'] in existing_refs:
+            report.append({"row": booking['row'], "status": "duplicate"})
+            continue
+        
+        description = booking['description'].lower()
+        rule = next((
+            r for r in rules
+            if r['pattern'].lower() in description and r.get('type') in (None, booking['type'])
+        ), None)
+        account_id = rule['account_id'] if rule else defaults[booking['type']]
+        if account_id not in account_names:
+            report.append({"row": booking['row'], "status": "error", "error": "Kein Konto zugeordnet"})
+            continue
+        
+        transaction = Transaction(
+            date=booking['date'],
+            description=booking['description'] or 'Bankbuchung',
+            type=booking['type'],
+            amount=booking['amount'],
+            account_id=account_id,
+            account_name=account_names[account_id],
+            payment_method=payment_method,
+            user_id=user['id']
+        )
+        transaction_dict = transaction.model_dump()
+        transaction_dict['amount_rappen'] = to_rappen(transaction.amount)
+        transaction_dict['import_ref'] = booking['ref']
+        new_transactions.append(transaction_dict)
+        existing_refs.add(booking['ref'])
+        report.append({
+            "row": booking['row'],
+            "status": "would_create" if dry_run else "created",
+            "id": transaction.id,
+            "date": transaction.date,
+            "amount": transaction.amount,
+            "type": transaction.type,
+            "account_name": transaction.account_name
+        })
+    
+    if not dry_run and new_transactions:
+        month_keys = {t['date'][:7] for t in new_transactions}
+        async with transaction_write(*month_keys):
+            for start in range(0, len(new_transactions), IMPORT_BATCH_SIZE):
+                await db.transactions.insert_many(new_transactions[start:start + IMPORT_BATCH_SIZE], ordered=False)
+            await apply_many_to_summary(new_transactions)
+        for month_key in month_keys:
+            invalidate_pdf_cache(month_key)
+    
+    counts = {}
+    for entry in report:
+        counts[entry['status']] = counts.get(entry['status'], 0) + 1
+    
+    return {"dry_run": dry_run, "counts": counts, "rows": report}
+
 # File upload
 @api_router.post("/upload/{transaction_id}")
 async def upload_file(transaction_id: str, file: UploadFile = File(...), user: dict = Depends(get_current_user)):
     # Save file
-    file_extension = file.filename.split('.')[-1]
-    file_name = f"{transaction_id}_{uuid.uuid4()}.{file_extension}"
-    file_path = UPLOAD_DIR / file_name
-    
-    with open(file_path, 'wb') as f:
-        shutil.copyfileobj(file.file, f)
+    file_url = await save_upload(file, "transactions", transaction_id)
     
     # Update transaction
-    file_url = f"/api/files/{file_name}"
-    await db.transactions.update_one({"id": transaction_id}, {"$set": {"file_url": file_url}})
+    trans = await db.transactions.find_one_and_update(
+        {"id": transaction_id},
+        {"$set": {"file_url": file_url, "updated_at": datetime.now(timezone.utc)}},
+        projection={"_id": 0, "date": 1}
+    )
+    if trans:
+        await bump_transaction_versions(trans['date'][:7])
     
     return {"file_url": file_url}
 
+# Background work started by a request; keep references so tasks are not collected early
+background_tasks = set()
+
+def run_in_background(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+# Previews
+
+def preview_path(file_name: str, size: int) -> Path:
+    return PREVIEW_DIR / f"{file_name.rsplit('.', 1)[0]}_{size}.webp"
+
+def render_preview(source: Path, target: Path, size: int) -> bool:
+    """Write a WebP of at most size x size pixels; PDFs use their first page."""
+    temp_path = target.with_name(f".{uuid.uuid4()}.part")
+    try:
+        if source.suffix.lower() == '.pdf':
+            # Pillow cannot rasterize PDFs; use poppler's pdftoppm when it is installed
+            if not shutil.which('pdftoppm'):
+                return False
+            subprocess.run(
+                ['pdftoppm', '-f', '1', '-l', '1', '-singlefile', '-png', '-scale-to', str(size), str(source), str(temp_path)],
+                check=True, timeout=30, capture_output=True
+            )
+            raster_path = temp_path.with_name(temp_path.name + '.png')
+            with Image.open(raster_path) as image:
+                image.save(temp_path, 'WEBP', quality=80)
+            raster_path.unlink()
+        else:
+            with Image.open(source) as image:
+                image = ImageOps.exif_transpose(image)
+                image.thumbnail((size, size))
+                if image.mode not in ('RGB', 'RGBA'):
+                    image = image.convert('RGB')
+                image.save(temp_path, 'WEBP', quality=80)
+        os.replace(temp_path, target)
+        return True
+    except Exception as e:
+        logger.warning(f"Could not render preview of {source.name}: {e}")
+        return False
+    finally:
+        temp_path.unlink(missing_ok=True)
+
+async def ensure_preview(file_name: str, size: int) -> Optional[Path]:
+    target = preview_path(file_name, size)
+    if target.exists():
+        return target
+    if await run_in_threadpool(render_preview, UPLOAD_DIR / file_name, target, size):
+        return target
+    return None
+
+def schedule_previews(file_name: str):
+    """Render all preview sizes of a new upload in the background."""
+    if file_name.rsplit('.', 1)[-1].lower() not in PREVIEW_EXTENSIONS:
+        return
+    
+    async def render_all():
+        for size in PREVIEW_SIZES:
+            await ensure_preview(file_name, size)
+    
+    run_in_background(render_all())
+
+# File serving
+# Upload names never get reused for other content, so files can be cached for good
+FILE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+CONTENT_HASH_NAME = re.compile(r'^([0-9a-f]{64})\.')
+
+def file_etag(file_name: str) -> str:
+    match = CONTENT_HASH_NAME.match(file_name)
+    if match:
+        return f'"{match.group(1)}"'
+    return f'"{hashlib.sha256(file_name.encode()).hexdigest()}"'
+
+def parse_range(range_header: str, size: int) -> Optional[tuple]:
+    """Parse a single 'bytes=start-end' range; None means serve the whole file."""
+    match = re.fullmatch(r'bytes=(\d*)-(\d*)', range_header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    if match.group(1) == '':
+        start = max(size - int(match.group(2)), 0)
+        end = size - 1
+    else:
+        start = int(match.group(1))
+        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+def iter_file_range(file_path: Path, start: int, end: int):
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(UPLOAD_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
 @api_router.get("/files/{file_name}")
-async def get_file(file_name: str):
+async def get_file(file_name: str, request: Request, size: Optional[int] = None):
     file_path = UPLOAD_DIR / file_name
-    if not file_path.exists():
+    if not file_path.is_file():
         raise HTTPException(status_code=404, detail="File not found")
     
-    return FileResponse(file_path)
+    etag = file_etag(file_name)
+    if size is not None:
+        if size not in PREVIEW_SIZES:
+            raise HTTPException(status_code=400, detail=f"size must be one of {', '.join(map(str, PREVIEW_SIZES))}")
+        # Files without a preview (e.g. PDFs without pdftoppm) fall back to the original
+        preview = await ensure_preview(file_name, size) if file_name.rsplit('.', 1)[-1].lower() in PREVIEW_EXTENSIONS else None
+        if preview:
+            file_path = preview
+            etag = f'{etag[:-1]}-{size}"'
+    headers = {"ETag": etag, "Cache-Control": FILE_CACHE_CONTROL, "Accept-Ranges": "bytes"}
+    
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    
+    range_header = request.headers.get('range')
+    if_range = request.headers.get('if-range')
+    if range_header and (not if_range or if_range.strip() == etag):
+        size = file_path.stat().st_size
+        byte_range = parse_range(range_header, size)
+        if byte_range:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+            return StreamingResponse(
+                iter_file_range(file_path, start, end),
+                status_code=206,
+                media_type=mimetypes.guess_type(file_path.name)[0] or "application/octet-stream",
+                headers=headers
+            )
+    
+    return FileResponse(file_path, headers=headers, media_type=mimetypes.guess_type(file_path.name)[0])
 
 # Reports
-@api_router.get("/reports/yearly")
-async def get_yearly_report(year: int, user: dict = Depends(get_current_user)):
-    # Get all transactions for the year
-    transactions = await db.transactions.find(
-        {"date": {"$regex": f"^{year}"}},
-        {"_id": 0}
-    ).to_list(10000)
+async def ledger_report(month_keys: List[str]) -> dict:
+    """Account totals and monthly totals for consecutive months."""
+    # Totals per month/account/type, maintained on write
+    groups = await get_ledger_summaries(month_keys[0], month_keys[-1])
     
-    # Group by account
     account_totals = {}
+    monthly_totals = {month_key: {'income': 0, 'expense': 0, 'total': 0} for month_key in month_keys}
     
-    for trans in transactions:
-        account_id = trans['account_id']
-        account = await db.accounts.find_one({"id": account_id}, {"_id": 0})
-        
+    for group in groups:
+        # Group by account
+        account = await account_cache.get(group['account_id'])
         if account:
             account_name = account['name']
             if account_name not in account_totals:
                 account_totals[account_name] = {'income': 0, 'expense': 0, 'type': account['type']}
             
-            if trans['type'] == 'income':
-                account_totals[account_name]['income'] += trans['amount']
+            if group['type'] == 'income':
+                account_totals[account_name]['income'] += group['amount_rappen']
             else:
-                account_totals[account_name]['expense'] += trans['amount']
-    
-    # Calculate monthly totals
-    monthly_totals = {}
-    for month in range(1, 13):
-        month_trans = [t for t in transactions if t['date'].startswith(f"{year}-{month:02d}")]
-        income = sum([t['amount'] for t in month_trans if t['type'] == 'income'])
-        expense = sum([t['amount'] for t in month_trans if t['type'] == 'expense'])
-        monthly_totals[f"{year}-{month:02d}"] = {
-            'income': income,
-            'expense': expense,
-            'total': income - expense
-        }
+                account_totals[account_name]['expense'] += group['amount_rappen']
+        
+        # Monthly totals
+        month_totals = monthly_totals.get(group['month'])
+        if month_totals is not None and group['type'] in ('income', 'expense'):
+            month_totals[group['type']] += group['amount_rappen']
+    
+    # Summed in Rappen, reported in CHF
+    for totals in account_totals.values():
+        totals['income'] /= 100
+        totals['expense'] /= 100
+    for month_totals in monthly_totals.values():
+        month_totals['total'] = (month_totals['income'] - month_totals['expense']) / 100
+        month_totals['income'] /= 100
+        month_totals['expense'] /= 100
     
     return {
         'account_totals': account_totals,
         'monthly_totals': monthly_totals
     }
 
-@api_router.get("/reports/export-pdf")
-async def export_pdf(year: int, month: int, user: dict = Depends(get_current_user)):
-    
+@api_router.get("/reports/yearly")
+async def get_yearly_report(year: int, request: Request, response: Response, user: dict = Depends(get_current_user)):
+    month_keys = month_range(f"{year}-01", f"{year}-12")
+    etag = await versions_etag(*(f"transactions:{month_key}" for month_key in month_keys), "accounts")
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=version_headers(etag))
+    
+    response.headers.update(version_headers(etag))
+    return await ledger_report(month_keys)
+
+# PDF rendering is CPU-bound, so it runs in worker processes. The pool is
+# created on first use with spawn, which is safe next to the Motor threads.
+pdf_executor = None
+pdf_semaphore = asyncio.Semaphore(PDF_WORKERS)
+pdf_metrics = PoolMetrics()
+
+def drop_render(future, discard=None):
+    """Done-callback for a render nobody waits for any more: log a failure, then clean up after it."""
+    if not future.cancelled() and future.exception() is not None:
+        logger.warning("Abandoned PDF render failed: %r", future.exception())
+    if discard is not None:
+        discard()
+
+async def render_pdf(func, *args, discard=None) -> bytes:
+    """Run func(*args) in the PDF pool; discard() runs once the worker is done if the render fails or is given up."""
+    global pdf_executor
+    if pdf_executor is None:
+        pdf_executor = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    
+    queued_at = time.monotonic()
+    pdf_metrics.pending += 1
+    try:
+        await pdf_semaphore.acquire()
+        pdf_metrics.record_wait(time.monotonic() - queued_at)
+        try:
+            future = asyncio.wrap_future(pdf_executor.submit(func, *args))
+        except BaseException:
+            pdf_semaphore.release()
+            raise
+        # A worker process cannot be interrupted, so its slot is only freed when
+        # the render really ends, not when the request stops waiting for it
+        future.add_done_callback(lambda _: pdf_semaphore.release())
+        try:
+            pdf_bytes = await asyncio.wait_for(asyncio.shield(future), PDF_TIMEOUT)
+        except BaseException as exc:
+            future.add_done_callback(functools.partial(drop_render, discard=discard))
+            if isinstance(exc, asyncio.TimeoutError):
+                raise HTTPException(status_code=504, detail="PDF-Export dauert zu lange")
+            raise
+        pdf_metrics.completed += 1
+        return pdf_bytes
+    finally:
+        pdf_metrics.pending -= 1
+
+def write_file_atomic(path: Path, data: bytes):
+    temp_path = path.with_name(f".{uuid.uuid4()}.part")
+    try:
+        temp_path.write_bytes(data)
+        os.replace(temp_path, path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+
+def invalidate_pdf_cache(month_key: Optional[str] = None):
+    """Drop cached exports of one month ('YYYY-MM'), or of every month."""
+    pattern = f"saferide_{month_key.replace('-', '_')}_*.pdf" if month_key else "saferide_*.pdf"
+    for cached in PDF_CACHE_DIR.glob(pattern):
+        cached.unlink(missing_ok=True)
+
+async def get_month_pdf(year: int, month: int) -> Path:
+    """Path of the month's export, rendered only if the month's content changed since the last one."""
     # Get transactions for the month
     transactions = await db.transactions.find(
-        {"date": {"$regex": f"^{year}-{month:02d}"}},
-        {"_id": 0}
-    ).sort("date", 1).to_list(10000)
+        date_range_query(year, month),
+        {"_id": 0, "date": 1, "description": 1, "type": 1, "amount": 1, "account_id": 1, "remarks": 1}
+    ).sort([("date", 1), ("id", 1)]).to_list(None)
     
     # Populate account names
+    account_names = await account_cache.names()
     for trans in transactions:
-        account = await db.accounts.find_one({"id": trans['account_id']}, {"_id": 0})
-        if account:
-            trans['account_name'] = account['name']
+        if trans['account_id'] in account_names:
+            trans['account_name'] = account_names[trans['account_id']]
     
-    # Create PDF
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    elements = []
+    content_hash = hashlib.sha256(json.dumps(transactions, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    pdf_path = PDF_CACHE_DIR / f"saferide_{year}_{month:02d}_{content_hash}.pdf"
+    if not pdf_path.exists():
+        pdf_bytes = await render_pdf(render_month_pdf, year, month, transactions)
+        await run_in_threadpool(write_file_atomic, pdf_path, pdf_bytes)
     
-    styles = getSampleStyleSheet()
+    return pdf_path
+
+async def pin_month_pdf(month_key: str):
+    """Render a locked month's export and remember it on the lock for direct serving."""
+    year, month = (int(part) for part in month_key.split('-'))
+    pdf_path = await get_month_pdf(year, month)
+    await db.month_locks.update_one({"month_key": month_key, "locked": True}, {"$set": {"pdf_file": pdf_path.name}})
+    return pdf_path
+
+@api_router.get("/reports/export-pdf")
+async def export_pdf(year: int, month: int, user: dict = Depends(get_current_user)):
+    month_key = f"{year}-{month:02d}"
     
-    # Title
-    title = Paragraph(f"Fahrschule Saferide by Nadine Stäubli - {month}/{year}", styles['Title'])
-    elements.append(title)
-    elements.append(Spacer(1, 0.5*cm))
+    # Locked months are served from their pinned export
+    lock = await db.month_locks.find_one({"month_key": month_key, "locked": True}, {"_id": 0})
+    pdf_path = PDF_CACHE_DIR / lock['pdf_file'] if lock and lock.get('pdf_file') else None
+    if pdf_path is None or not pdf_path.exists():
+        pdf_path = await pin_month_pdf(month_key) if lock else await get_month_pdf(year, month)
     
-    # Table data
-    table_data = [['Datum', 'Bezeichnung', 'Konto', 'Einnahmen', 'Ausgaben', 'Bemerkungen']]
+    return FileResponse(
+        pdf_path,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f"attachment; filename=saferide_{year}_{month:02d}.pdf"}
+    )
+
+@api_router.get("/reports/export-pdf-range")
+async def export_pdf_range(start: str, end: str, user: dict = Depends(get_current_user)):
+    """Export the months start..end ('YYYY-MM', inclusive) as one PDF, e.g. a year-end Abschluss."""
+    if not (re.fullmatch(r'\d{4}-(0[1-9]|1[0-2])', start) and re.fullmatch(r'\d{4}-(0[1-9]|1[0-2])', end)) or start > end:
+        raise HTTPException(status_code=400, detail="start and end must be months (YYYY-MM) with start <= end")
+    month_count = (int(end[:4]) - int(start[:4])) * 12 + int(end[5:]) - int(start[5:]) + 1
+    if month_count > PDF_RANGE_MAX_MONTHS:
+        raise HTTPException(status_code=400, detail=f"At most {PDF_RANGE_MAX_MONTHS} months per export")
     
-    total_income = 0
-    total_expense = 0
+    month_keys = month_range(start, end)
+    transactions = await db.transactions.find(
+        {"date": {"$gte": start, "$lt": next_month(end)}},
+        {"_id": 0, "date": 1, "description": 1, "type": 1, "amount": 1, "account_id": 1, "remarks": 1}
+    ).sort([("date", 1), ("id", 1)]).to_list(None)
     
+    # Populate account names and split into month sections
+    account_names = await account_cache.names()
+    months = {}
     for trans in transactions:
-        income = f"{trans['amount']:.2f}" if trans['type'] == 'income' else ''
-        expense = f"{trans['amount']:.2f}" if trans['type'] == 'expense' else ''
-        
-        if trans['type'] == 'income':
-            total_income += trans['amount']
-        else:
-            total_expense += trans['amount']
-        
-        table_data.append([
-            trans['date'],
-            trans['description'][:30],
-            trans.get('account_name', '')[:20],
-            income,
-            expense,
-            trans.get('remarks', '')[:30]
-        ])
-    
-    # Totals
-    table_data.append(['', '', 'Total:', f"{total_income:.2f}", f"{total_expense:.2f}", ''])
-    total_balance = total_income - total_expense
-    table_data.append(['', '', 'Einkommen:', '', f"{total_balance:.2f}", ''])
-    
-    # Create table - Adjusted for landscape
-    table = Table(table_data, colWidths=[3*cm, 5*cm, 4*cm, 3*cm, 3*cm, 4*cm])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('ALIGN', (3, 1), (4, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 9),
-        ('FONTSIZE', (0, 1), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('BACKGROUND', (0, -2), (-1, -1), colors.lightgrey),
-    ]))
-    
-    elements.append(table)
-    doc.build(elements)
-    
-    buffer.seek(0)
-    return StreamingResponse(
-        buffer,
+        if trans['account_id'] in account_names:
+            trans['account_name'] = account_names[trans['account_id']]
+        months.setdefault(trans['date'][:7], []).append(trans)
+    
+    report = await ledger_report(month_keys)
+    title = start[:4] if start.endswith('-01') and end == f"{start[:4]}-12" else f"{start} - {end}"
+    
+    # Rendered to a temp file and sent from disk rather than buffered in memory
+    fd, pdf_path = tempfile.mkstemp(suffix='.pdf', dir=PDF_CACHE_DIR)
+    os.close(fd)
+    await render_pdf(
+        render_range_pdf, pdf_path, title, list(months.items()), report,
+        discard=functools.partial(Path(pdf_path).unlink, missing_ok=True)
+    )
+    
+    return FileResponse(
+        pdf_path,
         media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename=saferide_{year}_{month:02d}.pdf"}
+        headers={"Content-Disposition": f"attachment; filename=saferide_{start.replace('-', '_')}_{end.replace('-', '_')}.pdf"},
+        background=BackgroundTask(os.unlink, pdf_path)
     )
 
 # User management (Admin only)
@@ -592,11 +1817,8 @@ async def get_users(user: dict = Depends(get_current_user)):
     if user['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Only admins can view users")
     
-    users = await db.users.find({}, {"_id": 0, "password_hash": 0}).to_list(1000)
-    for u in users:
-        if isinstance(u.get('created_at'), str):
-            u['created_at'] = datetime.fromisoformat(u['created_at'])
-    return users
+    users = await db.users.find({}, model_projection(User)).to_list(1000)
+    return FastJSONResponse(users)
 
 @api_router.delete("/users/{user_id}")
 async def delete_user(user_id: str, user: dict = Depends(get_current_user)):
@@ -610,6 +1832,8 @@ async def delete_user(user_id: str, user: dict = Depends(get_current_user)):
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     
+    await user_cache.revoke(user_id)
+    
     return {"message": "User deleted successfully"}
 
 class PasswordChange(BaseModel):
@@ -625,25 +1849,33 @@ async def change_password(password_data: PasswordChange, user: dict = Depends(ge
         raise HTTPException(status_code=404, detail="User not found")
     
     # Verify old password
-    if not bcrypt.checkpw(password_data.old_password.encode(), db_user['password_hash'].encode()):
+    if not await check_password(password_data.old_password, db_user['password_hash']):
         raise HTTPException(status_code=400, detail="Altes Passwort ist falsch")
     
     # Hash new password
-    new_password_hash = bcrypt.hashpw(password_data.new_password.encode(), bcrypt.gensalt()).decode()
+    new_password_hash = await hash_password(password_data.new_password)
     
     # Update password
-    await db.users.update_one({"id": user['id']}, {"$set": {"password_hash": new_password_hash}})
+    await db.users.update_one({"id": user['id']}, {"$set": {"password_hash": new_password_hash, "updated_at": datetime.now(timezone.utc)}})
+    user_cache.invalidate(user['id'])
     
     return {"message": "Passwort erfolgreich geaendert"}
 
+@api_router.get("/metrics")
+async def get_metrics(user: dict = Depends(get_current_user)):
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admins can view metrics")
+    
+    return {
+        "password_hashing": hash_metrics.snapshot(),
+        "pdf_rendering": pdf_metrics.snapshot()
+    }
+
 
 # Bank Documents
 @api_router.get("/bank-documents")
 async def get_bank_documents(month: str, user: dict = Depends(get_current_user)):
     docs = await db.bank_documents.find({"month": month}, {"_id": 0}).sort("date", -1).to_list(1000)
-    for doc in docs:
-        if isinstance(doc.get('created_at'), str):
-            doc['created_at'] = datetime.fromisoformat(doc['created_at'])
     return docs
 
 @api_router.post("/bank-documents")
@@ -656,23 +1888,17 @@ async def create_bank_document(doc_data: BankDocumentCreate, user: dict = Depend
     )
     
     bank_doc_dict = bank_doc.model_dump()
-    bank_doc_dict['created_at'] = bank_doc_dict['created_at'].isoformat()
     
     await db.bank_documents.insert_one(bank_doc_dict)
+    await bump_versions("month_records")
     return bank_doc
 
 @api_router.post("/bank-documents/{doc_id}/upload")
 async def upload_bank_document(doc_id: str, file: UploadFile = File(...), user: dict = Depends(get_current_user)):
-    file_extension = file.filename.split('.')[-1]
-    file_name = f"bank_{doc_id}_{uuid.uuid4()}.{file_extension}"
-    file_path = UPLOAD_DIR / file_name
-    
-    with open(file_path, 'wb') as f:
-        shutil.copyfileobj(file.file, f)
-    
-    file_url = f"/api/files/{file_name}"
+    file_url = await save_upload(file, "bank_documents", doc_id)
     # Save original filename
-    await db.bank_documents.update_one({"id": doc_id}, {"$set": {"file_url": file_url, "filename": file.filename}})
+    await db.bank_documents.update_one({"id": doc_id}, {"$set": {"file_url": file_url, "filename": file.filename, "updated_at": datetime.now(timezone.utc)}})
+    await bump_versions("month_records")
     
     return {"file_url": file_url}
 
@@ -681,15 +1907,14 @@ async def delete_bank_document(doc_id: str, user: dict = Depends(get_current_use
     result = await db.bank_documents.delete_one({"id": doc_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Document not found")
+    await release_uploads("bank_documents", doc_id)
+    await bump_versions("month_records")
     return {"message": "Document deleted successfully"}
 
 # Misc Items
 @api_router.get("/misc-items")
 async def get_misc_items(month: str, user: dict = Depends(get_current_user)):
     items = await db.misc_items.find({"month": month}, {"_id": 0}).sort("date", -1).to_list(1000)
-    for item in items:
-        if isinstance(item.get('created_at'), str):
-            item['created_at'] = datetime.fromisoformat(item['created_at'])
     return items
 
 @api_router.post("/misc-items")
@@ -702,23 +1927,17 @@ async def create_misc_item(item_data: MiscItemCreate, user: dict = Depends(get_c
     )
     
     misc_item_dict = misc_item.model_dump()
-    misc_item_dict['created_at'] = misc_item_dict['created_at'].isoformat()
     
     await db.misc_items.insert_one(misc_item_dict)
+    await bump_versions("month_records")
     return misc_item
 
 @api_router.post("/misc-items/{item_id}/upload")
 async def upload_misc_file(item_id: str, file: UploadFile = File(...), user: dict = Depends(get_current_user)):
-    file_extension = file.filename.split('.')[-1]
-    file_name = f"misc_{item_id}_{uuid.uuid4()}.{file_extension}"
-    file_path = UPLOAD_DIR / file_name
-    
-    with open(file_path, 'wb') as f:
-        shutil.copyfileobj(file.file, f)
-    
-    file_url = f"/api/files/{file_name}"
+    file_url = await save_upload(file, "misc_items", item_id)
     # Save original filename
-    await db.misc_items.update_one({"id": item_id}, {"$set": {"file_url": file_url, "filename": file.filename}})
+    await db.misc_items.update_one({"id": item_id}, {"$set": {"file_url": file_url, "filename": file.filename, "updated_at": datetime.now(timezone.utc)}})
+    await bump_versions("month_records")
     
     return {"file_url": file_url}
 
@@ -727,80 +1946,93 @@ async def delete_misc_item(item_id: str, user: dict = Depends(get_current_user))
     result = await db.misc_items.delete_one({"id": item_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Item not found")
+    await release_uploads("misc_items", item_id)
+    await bump_versions("month_records")
     return {"message": "Item deleted successfully"}
 
 # Statistics for accounting report
 @api_router.get("/reports/statistics")
-async def get_statistics(year: int, user: dict = Depends(get_current_user)):
-    # Get all transactions for the year
-    transactions = await db.transactions.find(
-        {"date": {"$regex": f"^{year}"}},
-        {"_id": 0}
-    ).to_list(10000)
-    
-    # Count Fahrstunden (driving lessons)
-    fahrstunden_account = await db.accounts.find_one({"name": {"$regex": "Fahrstunden", "$options": "i"}}, {"_id": 0})
+async def get_statistics(year: int, request: Request, response: Response, lesson_account_ids: Optional[List[str]] = Query(None), user: dict = Depends(get_current_user)):
+    etag = await versions_etag(*(f"transactions:{year}-{month:02d}" for month in range(1, 13)), "accounts")
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=version_headers(etag))
+    response.headers.update(version_headers(etag))
+    
+    # Totals per month/account/type/payment method for the year, maintained on write
+    groups = await get_ledger_summaries(f"{year}-01", f"{year}-12")
+    
+    # Fahrstunden (driving lessons): explicit accounts or every account named "Fahrstunden"
+    if lesson_account_ids:
+        lesson_accounts = set(lesson_account_ids)
+    else:
+        accounts = await account_cache.all()
+        lesson_accounts = {a['id'] for a in accounts if 'fahrstunden' in a['name'].lower()}
     fahrstunden_count = 0
     fahrstunden_revenue = 0
     
-    if fahrstunden_account:
-        fahrstunden_trans = [t for t in transactions if t['account_id'] == fahrstunden_account['id']]
-        fahrstunden_count = len(fahrstunden_trans)
-        fahrstunden_revenue = sum([t['amount'] for t in fahrstunden_trans])
-    
-    # Monthly breakdown
-    monthly_data = {}
-    for month in range(1, 13):
-        month_key = f"{year}-{month:02d}"
-        month_trans = [t for t in transactions if t['date'].startswith(month_key)]
-        monthly_data[month_key] = {
-            'income': sum([t['amount'] for t in month_trans if t['type'] == 'income']),
-            'expense': sum([t['amount'] for t in month_trans if t['type'] == 'expense'])
-        }
-    
-    # Payment methods breakdown
+    monthly_data = {f"{year}-{month:02d}": {'income': 0, 'expense': 0} for month in range(1, 13)}
     payment_methods = {}
-    for trans in transactions:
-        method = trans.get('payment_method', 'Unbekannt')
-        if method not in payment_methods:
-            payment_methods[method] = 0
-        payment_methods[method] += trans['amount']
     
+    for group in groups:
+        if group['account_id'] in lesson_accounts:
+            fahrstunden_count += group['count']
+            fahrstunden_revenue += group['amount_rappen']
+        
+        # Monthly breakdown
+        month_data = monthly_data.get(group['month'])
+        if month_data is not None and group['type'] in ('income', 'expense'):
+            month_data[group['type']] += group['amount_rappen']
+        
+        # Payment methods breakdown
+        method = group.get('payment_method') or 'Unbekannt'
+        payment_methods[method] = payment_methods.get(method, 0) + group['amount_rappen']
+    
+    # Summed in Rappen, reported in CHF
     return {
         'fahrstunden_count': fahrstunden_count,
-        'fahrstunden_revenue': fahrstunden_revenue,
-        'monthly_data': monthly_data,
-        'payment_methods': payment_methods
+        'fahrstunden_revenue': fahrstunden_revenue / 100,
+        'monthly_data': {
+            month_key: {'income': data['income'] / 100, 'expense': data['expense'] / 100}
+            for month_key, data in monthly_data.items()
+        },
+        'payment_methods': {method: rappen / 100 for method, rappen in payment_methods.items()}
     }
 
 
 
 # Vehicle Management
 @api_router.get("/vehicles", response_model=List[Vehicle])
-async def get_vehicles(user: dict = Depends(get_current_user)):
-    vehicles = await db.vehicles.find({}, {"_id": 0}).sort("marke", 1).to_list(1000)
-    for vehicle in vehicles:
-        if isinstance(vehicle.get('created_at'), str):
-            vehicle['created_at'] = datetime.fromisoformat(vehicle['created_at'])
-    return vehicles
+async def get_vehicles(request: Request, fields: Optional[str] = None, since: Optional[str] = None, user: dict = Depends(get_current_user)):
+    etag = await versions_etag("vehicles")
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=version_headers(etag))
+    
+    projection = fields_projection(Vehicle, fields)
+    if since:
+        return FastJSONResponse(await delta_sync("vehicles", projection, since), headers=version_headers(etag))
+    
+    synced_at = datetime.now(timezone.utc)
+    vehicles = await db.vehicles.find({}, projection).sort("marke", 1).to_list(1000)
+    return FastJSONResponse(vehicles, headers={**version_headers(etag), "X-Sync-Token": sync_token(synced_at)})
 
 @api_router.post("/vehicles", response_model=Vehicle)
 async def create_vehicle(vehicle_data: VehicleCreate, user: dict = Depends(get_current_user)):
     vehicle = Vehicle(**vehicle_data.model_dump())
     vehicle_dict = vehicle.model_dump()
-    vehicle_dict['created_at'] = vehicle_dict['created_at'].isoformat()
     
     await db.vehicles.insert_one(vehicle_dict)
+    await bump_versions("vehicles")
     return vehicle
 
 @api_router.put("/vehicles/{vehicle_id}")
 async def update_vehicle(vehicle_id: str, vehicle_data: VehicleUpdate, user: dict = Depends(get_current_user)):
     update_data = {k: v for k, v in vehicle_data.model_dump().items() if v is not None}
-    result = await db.vehicles.update_one({"id": vehicle_id}, {"$set": update_data})
+    result = await db.vehicles.update_one({"id": vehicle_id}, {"$set": {**update_data, "updated_at": datetime.now(timezone.utc)}})
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Vehicle not found")
     
+    await bump_versions("vehicles")
     return {"message": "Vehicle updated successfully"}
 
 @api_router.delete("/vehicles/{vehicle_id}")
@@ -808,40 +2040,27 @@ async def delete_vehicle(vehicle_id: str, user: dict = Depends(get_current_user)
     result = await db.vehicles.delete_one({"id": vehicle_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Vehicle not found")
+    await record_tombstones("vehicles", [vehicle_id])
+    await release_uploads("vehicles", vehicle_id)
+    await bump_versions("vehicles")
     return {"message": "Vehicle deleted successfully"}
 
 
 @api_router.post("/vehicles/{vehicle_id}/fahrzeugausweis")
 async def upload_fahrzeugausweis(vehicle_id: str, file: UploadFile = File(...), user: dict = Depends(get_current_user)):
-    file_extension = file.filename.split('.')[-1]
-    file_name = f"fahrzeugausweis_{vehicle_id}_{uuid.uuid4()}.{file_extension}"
-    file_path = UPLOAD_DIR / file_name
-    
-    with open(file_path, 'wb') as f:
-        shutil.copyfileobj(file.file, f)
-    
-    file_url = f"/api/files/{file_name}"
-    await db.vehicles.update_one({"id": vehicle_id}, {"$set": {"fahrzeugausweis_url": file_url}})
+    file_url = await save_upload(file, "vehicles", vehicle_id, "fahrzeugausweis_url")
+    await db.vehicles.update_one({"id": vehicle_id}, {"$set": {"fahrzeugausweis_url": file_url, "updated_at": datetime.now(timezone.utc)}})
+    await bump_versions("vehicles")
     
     return {"file_url": file_url}
 
 @api_router.post("/vehicles/{vehicle_id}/images")
 async def upload_vehicle_image(vehicle_id: str, file: UploadFile = File(...), user: dict = Depends(get_current_user)):
-    file_extension = file.filename.split('.')[-1]
-    file_name = f"vehicle_img_{vehicle_id}_{uuid.uuid4()}.{file_extension}"
-    file_path = UPLOAD_DIR / file_name
-    
-    with open(file_path, 'wb') as f:
-        shutil.copyfileobj(file.file, f)
-    
-    file_url = f"/api/files/{file_name}"
+    file_url = await save_upload(file, "vehicles", vehicle_id, "images", replace=False)
     
     # Add to images array
-    vehicle = await db.vehicles.find_one({"id": vehicle_id}, {"_id": 0})
-    if vehicle:
-        images = vehicle.get('images', [])
-        images.append(file_url)
-        await db.vehicles.update_one({"id": vehicle_id}, {"$set": {"images": images}})
+    await db.vehicles.update_one({"id": vehicle_id}, {"$push": {"images": file_url}, "$set": {"updated_at": datetime.now(timezone.utc)}})
+    await bump_versions("vehicles")
     
     return {"file_url": file_url}
 
@@ -849,16 +2068,12 @@ async def upload_vehicle_image(vehicle_id: str, file: UploadFile = File(...), us
 @api_router.get("/vehicles/{vehicle_id}/services")
 async def get_service_entries(vehicle_id: str, user: dict = Depends(get_current_user)):
     services = await db.service_entries.find({"vehicle_id": vehicle_id}, {"_id": 0}).sort("date", -1).to_list(1000)
-    for service in services:
-        if isinstance(service.get('created_at'), str):
-            service['created_at'] = datetime.fromisoformat(service['created_at'])
     return services
 
 @api_router.post("/services", response_model=ServiceEntry)
 async def create_service_entry(service_data: ServiceEntryCreate, user: dict = Depends(get_current_user)):
     service = ServiceEntry(**service_data.model_dump())
     service_dict = service.model_dump()
-    service_dict['created_at'] = service_dict['created_at'].isoformat()
     
     await db.service_entries.insert_one(service_dict)
     return service
@@ -867,7 +2082,7 @@ async def create_service_entry(service_data: ServiceEntryCreate, user: dict = De
 @api_router.put("/services/{service_id}")
 async def update_service_entry(service_id: str, service_data: ServiceEntryCreate, user: dict = Depends(get_current_user)):
     update_data = service_data.model_dump()
-    result = await db.service_entries.update_one({"id": service_id}, {"$set": update_data})
+    result = await db.service_entries.update_one({"id": service_id}, {"$set": {**update_data, "updated_at": datetime.now(timezone.utc)}})
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Service not found")
@@ -876,15 +2091,8 @@ async def update_service_entry(service_id: str, service_data: ServiceEntryCreate
 
 @api_router.post("/services/{service_id}/upload")
 async def upload_service_file(service_id: str, file: UploadFile = File(...), user: dict = Depends(get_current_user)):
-    file_extension = file.filename.split('.')[-1]
-    file_name = f"service_{service_id}_{uuid.uuid4()}.{file_extension}"
-    file_path = UPLOAD_DIR / file_name
-    
-    with open(file_path, 'wb') as f:
-        shutil.copyfileobj(file.file, f)
-    
-    file_url = f"/api/files/{file_name}"
-    await db.service_entries.update_one({"id": service_id}, {"$set": {"file_url": file_url}})
+    file_url = await save_upload(file, "service_entries", service_id)
+    await db.service_entries.update_one({"id": service_id}, {"$set": {"file_url": file_url, "updated_at": datetime.now(timezone.utc)}})
     
     return {"file_url": file_url}
 
@@ -893,34 +2101,42 @@ async def delete_service(service_id: str, user: dict = Depends(get_current_user)
     result = await db.service_entries.delete_one({"id": service_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Service entry not found")
+    await release_uploads("service_entries", service_id)
     return {"message": "Service entry deleted successfully"}
 
 # Customer Management
 @api_router.get("/customers", response_model=List[Customer])
-async def get_customers(user: dict = Depends(get_current_user)):
-    customers = await db.customers.find({}, {"_id": 0}).sort("name", 1).to_list(1000)
-    for customer in customers:
-        if isinstance(customer.get('created_at'), str):
-            customer['created_at'] = datetime.fromisoformat(customer['created_at'])
-    return customers
+async def get_customers(request: Request, fields: Optional[str] = None, since: Optional[str] = None, user: dict = Depends(get_current_user)):
+    etag = await versions_etag("customers")
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=version_headers(etag))
+    
+    projection = fields_projection(Customer, fields)
+    if since:
+        return FastJSONResponse(await delta_sync("customers", projection, since), headers=version_headers(etag))
+    
+    synced_at = datetime.now(timezone.utc)
+    customers = await db.customers.find({}, projection).sort("name", 1).to_list(1000)
+    return FastJSONResponse(customers, headers={**version_headers(etag), "X-Sync-Token": sync_token(synced_at)})
 
 @api_router.post("/customers", response_model=Customer)
 async def create_customer(customer_data: CustomerCreate, user: dict = Depends(get_current_user)):
     customer = Customer(**customer_data.model_dump())
     customer_dict = customer.model_dump()
-    customer_dict['created_at'] = customer_dict['created_at'].isoformat()
     
     await db.customers.insert_one(customer_dict)
+    await bump_versions("customers")
     return customer
 
 @api_router.put("/customers/{customer_id}")
 async def update_customer(customer_id: str, customer_data: CustomerCreate, user: dict = Depends(get_current_user)):
     update_data = customer_data.model_dump()
-    result = await db.customers.update_one({"id": customer_id}, {"$set": update_data})
+    result = await db.customers.update_one({"id": customer_id}, {"$set": {**update_data, "updated_at": datetime.now(timezone.utc)}})
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Customer not found")
     
+    await bump_versions("customers")
     return {"message": "Customer updated successfully"}
 
 @api_router.delete("/customers/{customer_id}")
@@ -928,37 +2144,28 @@ async def delete_customer(customer_id: str, user: dict = Depends(get_current_use
     result = await db.customers.delete_one({"id": customer_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Customer not found")
+    await record_tombstones("customers", [customer_id])
+    await bump_versions("customers")
     return {"message": "Customer deleted successfully"}
 
 # Customer Remarks
 @api_router.get("/customers/{customer_id}/remarks")
 async def get_customer_remarks(customer_id: str, user: dict = Depends(get_current_user)):
     remarks = await db.customer_remarks.find({"customer_id": customer_id}, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    for remark in remarks:
-        if isinstance(remark.get('created_at'), str):
-            remark['created_at'] = datetime.fromisoformat(remark['created_at'])
     return remarks
 
 @api_router.post("/customer-remarks", response_model=CustomerRemark)
 async def create_customer_remark(remark_data: CustomerRemarkCreate, user: dict = Depends(get_current_user)):
     remark = CustomerRemark(**remark_data.model_dump())
     remark_dict = remark.model_dump()
-    remark_dict['created_at'] = remark_dict['created_at'].isoformat()
     
     await db.customer_remarks.insert_one(remark_dict)
     return remark
 
 @api_router.post("/customer-remarks/{remark_id}/upload")
 async def upload_customer_remark_file(remark_id: str, file: UploadFile = File(...), user: dict = Depends(get_current_user)):
-    file_extension = file.filename.split('.')[-1]
-    file_name = f"customer_{remark_id}_{uuid.uuid4()}.{file_extension}"
-    file_path = UPLOAD_DIR / file_name
-    
-    with open(file_path, 'wb') as f:
-        shutil.copyfileobj(file.file, f)
-    
-    file_url = f"/api/files/{file_name}"
-    await db.customer_remarks.update_one({"id": remark_id}, {"$set": {"file_url": file_url}})
+    file_url = await save_upload(file, "customer_remarks", remark_id)
+    await db.customer_remarks.update_one({"id": remark_id}, {"$set": {"file_url": file_url, "updated_at": datetime.now(timezone.utc)}})
     
     return {"file_url": file_url}
 
@@ -967,6 +2174,7 @@ async def delete_customer_remark(remark_id: str, user: dict = Depends(get_curren
     result = await db.customer_remarks.delete_one({"id": remark_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Remark not found")
+    await release_uploads("customer_remarks", remark_id)
     return {"message": "Remark deleted successfully"}
 
 
@@ -974,9 +2182,6 @@ async def delete_customer_remark(remark_id: str, user: dict = Depends(get_curren
 @api_router.get("/important-uploads")
 async def get_important_uploads(user: dict = Depends(get_current_user)):
     uploads = await db.important_uploads.find({}, {"_id": 0}).sort("date", -1).to_list(1000)
-    for upload in uploads:
-        if isinstance(upload.get('created_at'), str):
-            upload['created_at'] = datetime.fromisoformat(upload['created_at'])
     return uploads
 
 @api_router.post("/important-uploads")
@@ -988,22 +2193,14 @@ async def create_important_upload(upload_data: ImportantUploadCreate, user: dict
     )
     
     upload_dict = upload.model_dump()
-    upload_dict['created_at'] = upload_dict['created_at'].isoformat()
     
     await db.important_uploads.insert_one(upload_dict)
     return upload
 
 @api_router.post("/important-uploads/{upload_id}/upload")
 async def upload_important_file(upload_id: str, file: UploadFile = File(...), user: dict = Depends(get_current_user)):
-    file_extension = file.filename.split('.')[-1]
-    file_name = f"important_{upload_id}_{uuid.uuid4()}.{file_extension}"
-    file_path = UPLOAD_DIR / file_name
-    
-    with open(file_path, 'wb') as f:
-        shutil.copyfileobj(file.file, f)
-    
-    file_url = f"/api/files/{file_name}"
-    await db.important_uploads.update_one({"id": upload_id}, {"$set": {"file_url": file_url}})
+    file_url = await save_upload(file, "important_uploads", upload_id)
+    await db.important_uploads.update_one({"id": upload_id}, {"$set": {"file_url": file_url, "updated_at": datetime.now(timezone.utc)}})
     
     return {"file_url": file_url}
 
@@ -1012,13 +2209,139 @@ async def delete_important_upload(upload_id: str, user: dict = Depends(get_curre
     result = await db.important_uploads.delete_one({"id": upload_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Upload not found")
+    await release_uploads("important_uploads", upload_id)
     return {"message": "Upload deleted successfully"}
 
 
+# File index
+# Every collection whose records carry a file_url, with the field used as description
+FILE_SOURCES = {
+    'transaction': ('transactions', '$description'),
+    'bank_document': ('bank_documents', {"$literal": "Bankbeleg"}),
+    'misc_item': ('misc_items', '$remarks'),
+    'important_upload': ('important_uploads', '$description'),
+    'service_entry': ('service_entries', '$description'),
+    'customer_remark': ('customer_remarks', '$remarks'),
+}
+
+def file_source_pipeline(file_type: str, year: Optional[int]) -> List[dict]:
+    description = FILE_SOURCES[file_type][1]
+    match = {"file_url": {"$nin": [None, ""]}}
+    if year:
+        match.update(date_range_query(year))
+    return [
+        {"$match": match},
+        {"$project": {
+            "_id": 0, "id": 1, "date": 1, "file_url": 1, "filename": 1,
+            "type": {"$literal": file_type}, "description": description,
+        }},
+    ]
+
+@api_router.get("/file-index")
+async def get_file_index(
+    year: Optional[int] = None,
+    type: Optional[List[str]] = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    user: dict = Depends(get_current_user)
+):
+    """All file-bearing records, newest first, gathered with one $unionWith aggregation."""
+    file_types = type or list(FILE_SOURCES)
+    unknown = [t for t in file_types if t not in FILE_SOURCES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown file type: {', '.join(unknown)}")
+    
+    pipeline = file_source_pipeline(file_types[0], year)
+    for file_type in file_types[1:]:
+        pipeline.append({"$unionWith": {"coll": FILE_SOURCES[file_type][0], "pipeline": file_source_pipeline(file_type, year)}})
+    pipeline.append({"$facet": {
+        "files": [{"$sort": {"date": -1, "id": -1}}, {"$skip": offset}, {"$limit": limit}],
+        "total": [{"$count": "count"}],
+    }})
+    
+    result = (await db[FILE_SOURCES[file_types[0]][0]].aggregate(pipeline).to_list(1))[0]
+    return {
+        "files": result['files'],
+        "total": result['total'][0]['count'] if result['total'] else 0
+    }
+
+
+# Dashboard
+# Payloads of adjacent months rendered ahead of navigation. Each is served at
+# most once, and only while the version counters it was loaded under are
+# unchanged, so a write on any worker retires it.
+dashboard_prefetch = {}
+
+async def dashboard_versions(month_key: str) -> str:
+    # month_records covers bank documents, misc items and month locks
+    return await versions_etag(f"transactions:{month_key}", "month_records", "accounts", "customers")
+
+async def load_dashboard(month_key: str) -> dict:
+    """Everything the month view needs, queried concurrently."""
+    year, month = (int(part) for part in month_key.split('-'))
+    lock, accounts, customers, transactions, bank_documents, misc_items = await asyncio.gather(
+        db.month_locks.find_one({"month_key": month_key}, {"_id": 0, "pdf_file": 0}),
+        account_cache.all(),
+        # The month view only needs the customer picker
+        db.customers.find({}, {"_id": 0, "id": 1, "name": 1, "vorname": 1, "active": 1}).sort("name", 1).to_list(None),
+        db.transactions.find(date_range_query(year, month), model_projection(Transaction)).sort([("date", -1), ("id", -1)]).to_list(None),
+        db.bank_documents.find({"month": month_key}, {"_id": 0}).sort("date", -1).to_list(None),
+        db.misc_items.find({"month": month_key}, {"_id": 0}).sort("date", -1).to_list(None),
+    )
+    
+    account_names = {account['id']: account['name'] for account in accounts}
+    total_income = 0
+    total_expense = 0
+    for trans in transactions:
+        if trans['account_id'] in account_names:
+            trans['account_name'] = account_names[trans['account_id']]
+        if trans['type'] == 'income':
+            total_income += transaction_rappen(trans)
+        elif trans['type'] == 'expense':
+            total_expense += transaction_rappen(trans)
+    total_income /= 100
+    total_expense /= 100
+    
+    return {
+        "month_key": month_key,
+        "lock": lock or {"locked": False, "month_key": month_key},
+        "accounts": accounts,
+        "customers": customers,
+        "transactions": transactions,
+        "bank_documents": bank_documents,
+        "misc_items": misc_items,
+        "totals": {"income": total_income, "expense": total_expense, "total": total_income - total_expense}
+    }
+
+async def prefetch_dashboard(month_key: str):
+    # Read the versions first: a write during the load leaves the payload tagged as older
+    versions = await dashboard_versions(month_key)
+    dashboard_prefetch[month_key] = (await load_dashboard(month_key), versions, time.monotonic())
+
+@api_router.get("/dashboard/{month_key}")
+async def get_dashboard(month_key: str, prefetch: Optional[str] = Query(None, pattern="^adjacent$"), user: dict = Depends(get_current_user)):
+    if not re.fullmatch(r'\d{4}-(0[1-9]|1[0-2])', month_key):
+        raise HTTPException(status_code=400, detail="Month must be YYYY-MM")
+    
+    entry = dashboard_prefetch.pop(month_key, None)
+    if entry and time.monotonic() - entry[2] < DASHBOARD_PREFETCH_TTL and entry[1] == await dashboard_versions(month_key):
+        payload = entry[0]
+    else:
+        payload = await load_dashboard(month_key)
+    
+    if prefetch == 'adjacent':
+        year, month = (int(part) for part in month_key.split('-'))
+        previous_month = f"{year - 1}-12" if month == 1 else f"{year}-{month - 1:02d}"
+        for adjacent in (previous_month, next_month(month_key)):
+            run_in_background(prefetch_dashboard(adjacent))
+    
+    return payload
+
+
 # Month Lock Management
 @api_router.get("/month-lock/{month_key}")
 async def get_month_lock(month_key: str):
-    lock = await db.month_locks.find_one({"month_key": month_key}, {"_id": 0})
+    lock = await db.month_locks.find_one({"month_key": month_key}, {"_id": 0, "pdf_file": 0})
     if not lock:
         return {"locked": False, "month_key": month_key}
     return lock
@@ -1033,7 +2356,10 @@ async def toggle_month_lock(lock_data: MonthLockToggle, user: dict = Depends(get
     if existing:
         await db.month_locks.update_one(
             {"month_key": lock_data.month_key}, 
-            {"$set": {"locked": lock_data.locked, "locked_by": user['id'], "locked_at": datetime.now(timezone.utc).isoformat()}}
+            {
+                "$set": {"locked": lock_data.locked, "locked_by": user['id'], "locked_at": datetime.now(timezone.utc)},
+                "$unset": {"pdf_file": ""}
+            }
         )
     else:
         lock = MonthLock(
@@ -1042,19 +2368,67 @@ async def toggle_month_lock(lock_data: MonthLockToggle, user: dict = Depends(get
             locked_by=user['id']
         )
         lock_dict = lock.model_dump()
-        lock_dict['locked_at'] = lock_dict['locked_at'].isoformat()
         await db.month_locks.insert_one(lock_dict)
+    await bump_versions("month_records")
+    
+    # A closed month's export is fixed, so render it now
+    if lock_data.locked and re.fullmatch(r'\d{4}-\d{2}', lock_data.month_key):
+        run_in_background(pin_month_pdf(lock_data.month_key))
     
     return {"message": f"Monat {'gesperrt' if lock_data.locked else 'entsperrt'}", "locked": lock_data.locked}
 
 app.include_router(api_router)
 
+class APIGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that leaves files and PDF exports alone: they are
+    compressed already, and /files answers Range requests."""
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith(UNCOMPRESSED_PATHS):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+app.add_middleware(APIGZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
+
+class RequestSizeLimitMiddleware:
+    """Refuse bodies over MAX_REQUEST_BYTES before anything parses them: by
+    Content-Length up front, and by counting for chunked bodies."""
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > MAX_REQUEST_BYTES:
+            response = ORJSONResponse({"detail": "Datei ist zu gross"}, status_code=413)
+            await response(scope, receive, send)
+            return
+        
+        received = 0
+        
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > MAX_REQUEST_BYTES:
+                    raise HTTPException(status_code=413, detail="Datei ist zu gross")
+            return message
+        
+        await self.app(scope, limited_receive, send)
+
+app.add_middleware(RequestSizeLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Sync-Token"],
 )
 
 logging.basicConfig(
@@ -1063,6 +2437,59 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Indexes backing the id lookups and the date/month filters
+INDEXES = {
+    'users': ['username'],
+    'accounts': ['name'],
+    'transactions': [[("date", -1), ("id", -1)], 'account_id', 'customer_id', 'updated_at'],
+    'bank_documents': ['month'],
+    'misc_items': ['month'],
+    'important_uploads': ['date'],
+    'month_locks': ['month_key'],
+    'vehicles': ['updated_at'],
+    'service_entries': ['vehicle_id'],
+    'customers': ['name', 'updated_at'],
+    'customer_remarks': ['customer_id'],
+    'import_rules': [],
+}
+
+@app.on_event("startup")
+async def create_indexes():
+    for collection, fields in INDEXES.items():
+        try:
+            await db[collection].create_index("id", unique=True)
+            for field in fields:
+                await db[collection].create_index(field)
+        except Exception as e:
+            logger.warning(f"Could not create indexes on {collection}: {e}")
+    
+    await db.transactions.create_index("import_ref", sparse=True)
+    await db.file_blobs.create_index("file_name", unique=True)
+    await db.versions.create_index("key", unique=True)
+    await db.revoked_users.create_index("id", unique=True)
+    # Revocations only need to outlive the claims fast path and cached user records
+    await db.revoked_users.create_index("revoked_at", expireAfterSeconds=int(max(TOKEN_CLAIMS_TTL, USER_CACHE_TTL)) + 60)
+    await db.tombstones.create_index([("collection", 1), ("deleted_at", 1)])
+    await db.tombstones.create_index("deleted_at", expireAfterSeconds=SYNC_TOMBSTONE_DAYS * 86400)
+    await db.file_refs.create_index([("collection", 1), ("entity_id", 1)])
+    await db.monthly_summaries.create_index(SUMMARY_KEY_INDEX, unique=True)
+    await db.locks.create_index("id", unique=True)
+
+@app.on_event("startup")
+async def backfill_monthly_summaries():
+    # First start after the summaries were introduced, or after they moved to
+    # integer Rappen: build them from the ledger
+    if not await db.monthly_summaries.find_one({"amount_rappen": {"$exists": True}}) and await db.transactions.find_one({}):
+        count = await rebuild_monthly_summaries()
+        if count is None:
+            logger.info("Monthly summaries are being built by another worker")
+        else:
+            logger.info(f"Built {count} monthly summaries from existing transactions")
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    global pdf_executor
+    client.close()
+    if pdf_executor is not None:
+        pdf_executor.shutdown(wait=False, cancel_futures=True)
+        pdf_executor = None
\ No newline at end of file
@@ -13,6 +13,7 @@ import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs';
 import { Switch } from '@/components/ui/switch';
 import { Plus, Trash2, Edit2, User, Eye, Upload } from 'lucide-react';
 import { formatDate, getCurrentDateISO } from '../utils/dateUtils';
+import { hasPreview, thumbnailUrl, hideBrokenThumbnail } from '../utils/fileUtils';
 
 function CustomerManagement() {
   const { token } = useContext(AuthContext);
@@ -346,7 +347,8 @@ function CustomerManagement() {
                             <p className="text-xs text-gray-500 font-semibold">{formatDate(r.date)}</p>
                             <p className="mt-1">{r.remarks}</p>
                             {r.file_url && (
-                              <a href={`${API.replace('/api', '')}${r.file_url}`} target="_blank" rel="noopener noreferrer" className="text-sm text-blue-600 hover:underline mt-1 inline-block">
+                              <a href={`${API.replace('/api', '')}${r.file_url}`} target="_blank" rel="noopener noreferrer" className="text-sm text-blue-600 hover:underline mt-1 inline-flex items-center gap-2">
+                                {hasPreview(r.file_url) && <img src={`${API.replace('/api', '')}${thumbnailUrl(r.file_url)}`} alt="Foto" loading="lazy" onError={hideBrokenThumbnail} className="h-12 w-12 object-cover rounded border" />}
                                 Foto ansehen
                               </a>
                             )}
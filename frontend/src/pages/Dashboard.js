@@ -50,20 +50,22 @@ function Dashboard() {
   const canEdit = isAdmin || !monthLocked;
 
   useEffect(() => {
-    fetchAccounts();
-    fetchCustomers();
-    fetchMonthLock();
-    fetchTransactions();
-    fetchBankDocuments();
-    fetchMiscItems();
+    fetchDashboard();
   }, [currentDate]);
 
-  const fetchMonthLock = async () => {
+  const fetchDashboard = async () => {
     try {
-      const response = await axios.get(`${API}/month-lock/${monthKey}`);
-      setMonthLocked(response.data.locked || false);
+      const response = await axios.get(`${API}/dashboard/${monthKey}?prefetch=adjacent`, {
+        headers: { Authorization: token }
+      });
+      setMonthLocked(response.data.lock.locked || false);
+      setAccounts(response.data.accounts);
+      setCustomers(response.data.customers.filter(c => c.active !== false));
+      setTransactions(response.data.transactions);
+      setBankDocuments(response.data.bank_documents);
+      setMiscItems(response.data.misc_items);
     } catch (error) {
-      console.error('Error fetching lock status:', error);
+      toast.error('Fehler beim Laden der Einträge');
     }
   };
 
@@ -81,24 +83,6 @@ function Dashboard() {
     }
   };
 
-  const fetchAccounts = async () => {
-    try {
-      const response = await axios.get(`${API}/accounts`);
-      setAccounts(response.data);
-    } catch (error) {
-      toast.error('Fehler beim Laden der Konten');
-    }
-  };
-
-  const fetchCustomers = async () => {
-    try {
-      const response = await axios.get(`${API}/customers`, { headers: { Authorization: token } });
-      setCustomers(response.data.filter(c => c.active !== false));
-    } catch (error) {
-      console.error('Fehler:', error);
-    }
-  };
-
   const fetchTransactions = async () => {
     try {
       const response = await axios.get(`${API}/transactions?year=${year}&month=${month}`, {
@@ -10,6 +10,16 @@ import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs';
 import { FileText, Image, Plus, Trash2 } from 'lucide-react';
 import { formatDate, getCurrentDateISO } from '../utils/dateUtils';
+import { hasPreview, thumbnailUrl, hideBrokenThumbnail } from '../utils/fileUtils';
+
+const FILE_TYPE_LABELS = {
+  transaction: 'Eintrag',
+  bank_document: 'Bankbeleg',
+  misc_item: 'Diverses',
+  important_upload: 'Wichtig',
+  service_entry: 'Service',
+  customer_remark: 'Kunde'
+};
 
 function FilesOverview() {
   const { token } = useContext(AuthContext);
@@ -24,33 +34,14 @@ function FilesOverview() {
   const fetchAllFiles = async () => {
     try {
       setLoading(true);
-      const transRes = await axios.get(`${API}/transactions`, { headers: { Authorization: token } });
       const files = [];
-      
-      transRes.data.forEach(t => {
-        if (t.file_url) files.push({ date: t.date, type: 'Eintrag', description: t.description, file_url: t.file_url });
-      });
-      
-      const currentYear = new Date().getFullYear();
-      for (let month = 1; month <= 12; month++) {
-        const monthKey = `${currentYear}-${String(month).padStart(2, '0')}`;
-        try {
-          const bankRes = await axios.get(`${API}/bank-documents?month=${monthKey}`, { headers: { Authorization: token } });
-          bankRes.data.forEach(d => { if (d.file_url) files.push({ date: d.date, type: 'Bankbeleg', description: 'Bankbeleg', file_url: d.file_url }); });
-        } catch (e) { console.error(e); }
-        
-        try {
-          const miscRes = await axios.get(`${API}/misc-items?month=${monthKey}`, { headers: { Authorization: token } });
-          miscRes.data.forEach(item => { if (item.file_url) files.push({ date: item.date, type: 'Diverses', description: item.remarks, file_url: item.file_url }); });
-        } catch (e) { console.error(e); }
-      }
-      
-      try {
-        const impRes = await axios.get(`${API}/important-uploads`, { headers: { Authorization: token } });
-        impRes.data.forEach(item => { if (item.file_url) files.push({ date: item.date, type: 'Wichtig', description: item.description, file_url: item.file_url }); });
-      } catch (e) { console.error(e); }
-      
-      files.sort((a, b) => b.date.localeCompare(a.date));
+      let total = 0;
+      do {
+        const response = await axios.get(`${API}/file-index?limit=1000&offset=${files.length}`, { headers: { Authorization: token } });
+        response.data.files.forEach(f => files.push({ ...f, type: FILE_TYPE_LABELS[f.type] || f.type }));
+        total = response.data.total;
+        if (response.data.files.length === 0) break;
+      } while (files.length < total);
       setAllFiles(files);
     } catch (error) {
       toast.error('Fehler beim Laden');
@@ -145,6 +136,7 @@ function FilesOverview() {
                         <td className="p-3 max-w-md truncate">{file.description}</td>
                         <td className="p-3 text-right">
                           <a href={`${API.replace('/api', '')}${file.file_url}`} target="_blank" rel="noopener noreferrer" className="text-blue-600 hover:underline inline-flex items-center gap-1">
+                            {hasPreview(file.file_url) && <img src={`${API.replace('/api', '')}${thumbnailUrl(file.file_url)}`} alt="" loading="lazy" onError={hideBrokenThumbnail} className="h-10 w-10 object-cover rounded border mr-1" />}
                             {file.file_url.endsWith('.pdf') ? <FileText className="h-4 w-4" /> : <Image className="h-4 w-4" />}
                             Ansehen
                           </a>
@@ -186,6 +178,7 @@ function FilesOverview() {
                       <p className="font-medium mt-1">{item.description}</p>
                       {item.file_url && (
                         <a href={`${API.replace('/api', '')}${item.file_url}`} target="_blank" rel="noopener noreferrer" className="text-sm text-blue-600 hover:underline mt-1 inline-flex items-center gap-1">
+                          {hasPreview(item.file_url) && <img src={`${API.replace('/api', '')}${thumbnailUrl(item.file_url)}`} alt="" loading="lazy" onError={hideBrokenThumbnail} className="h-12 w-12 object-cover rounded border mr-1" />}
                           {item.file_url.endsWith('.pdf') ? <FileText className="h-4 w-4" /> : <Image className="h-4 w-4" />}
                           Datei ansehen
                         </a>
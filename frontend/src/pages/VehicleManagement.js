@@ -11,6 +11,7 @@ import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogTrigger } from
 import { AlertDialog, AlertDialogAction, AlertDialogCancel, AlertDialogContent, AlertDialogDescription, AlertDialogFooter, AlertDialogHeader, AlertDialogTitle } from '@/components/ui/alert-dialog';
 import { Plus, Trash2, Edit2 } from 'lucide-react';
 import { formatDate, getCurrentDateISO } from '../utils/dateUtils';
+import { hasPreview, thumbnailUrl, hideBrokenThumbnail } from '../utils/fileUtils';
 
 function VehicleManagement() {
   const { token } = useContext(AuthContext);
@@ -288,7 +289,8 @@ function VehicleManagement() {
                         <p className="font-medium">{formatDate(s.date)} - KM: {s.km_stand.toLocaleString()}</p>
                         <p className="text-sm text-gray-600 mt-1">{s.description}</p>
                         {s.file_url && (
-                          <a href={`${API.replace('/api', '')}${s.file_url}`} target="_blank" rel="noopener noreferrer" className="text-sm text-blue-600 hover:underline mt-1 inline-block">
+                          <a href={`${API.replace('/api', '')}${s.file_url}`} target="_blank" rel="noopener noreferrer" className="text-sm text-blue-600 hover:underline mt-1 inline-flex items-center gap-2">
+                            {hasPreview(s.file_url) && <img src={`${API.replace('/api', '')}${thumbnailUrl(s.file_url)}`} alt="Beleg" loading="lazy" onError={hideBrokenThumbnail} className="h-12 w-12 object-cover rounded border" />}
                             Beleg ansehen
                           </a>
                         )}
@@ -330,7 +332,7 @@ function VehicleManagement() {
                   <div className="grid grid-cols-3 gap-2">
                     {v.images.map((img, idx) => (
                       <a key={idx} href={`${API.replace('/api', '')}${img}`} target="_blank" rel="noopener noreferrer">
-                        <img src={`${API.replace('/api', '')}${img}`} alt="Fahrzeug" className="w-full h-20 object-cover rounded border hover:opacity-80" />
+                        <img src={`${API.replace('/api', '')}${thumbnailUrl(img)}`} alt="Fahrzeug" loading="lazy" className="w-full h-20 object-cover rounded border hover:opacity-80" />
                       </a>
                     ))}
                   </div>
@@ -0,0 +1,21 @@
+// Uploaded file utilities
+
+// Preview size served by /api/files/{name}?size= (see PREVIEW_SIZES in the backend)
+export const THUMBNAIL_SIZE = 200;
+
+// Extensions the backend renders previews for; PDFs need pdftoppm on the server
+const PREVIEW_EXTENSIONS = ['jpg', 'jpeg', 'png', 'gif', 'webp', 'bmp', 'tif', 'tiff', 'pdf'];
+
+export const hasPreview = (fileUrl) => {
+  if (!fileUrl) return false;
+  return PREVIEW_EXTENSIONS.includes(fileUrl.split('.').pop().toLowerCase());
+};
+
+export const thumbnailUrl = (fileUrl, size = THUMBNAIL_SIZE) => {
+  return `${fileUrl}?size=${size}`;
+};
+
+// Without a server-side preview the original comes back, which an <img> may not show
+export const hideBrokenThumbnail = (e) => {
+  e.currentTarget.style.display = 'none';
+};
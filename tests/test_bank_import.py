@@ -0,0 +1,78 @@
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from bank_import import booking_ref, parse_amount, parse_date, parse_statement  # noqa: E402
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("90.00", 90.0),
+    ("-12,5", -12.5),
+    ("1'234.50", 1234.5),
+    ("1,234.50", 1234.5),
+    ("1.234,50", 1234.5),
+    ("1.234.567,89", 1234567.89),
+    ("1.234.567", 1234567.0),
+    ("CHF 5.05", 5.05),
+    ("12", 12.0),
+])
+def test_parse_amount(value, expected):
+    assert parse_amount(value) == expected
+
+
+@pytest.mark.parametrize("value", ["1,234", "1.234", "1,23.45", "abc"])
+def test_parse_amount_rejects_ambiguous_or_invalid(value):
+    with pytest.raises(ValueError):
+        parse_amount(value)
+
+
+@pytest.mark.parametrize("value", ["2025-03-01", "01.03.2025", "01.03.25", "01/03/2025"])
+def test_parse_date(value):
+    assert parse_date(value) == "2025-03-01"
+
+
+def test_csv_identical_bookings_get_distinct_refs():
+    csv_text = (
+        "Datum;Buchungstext;Betrag\n"
+        "01.03.2025;TWINT Fahrstunde;90,00\n"
+        "01.03.2025;TWINT Fahrstunde;90,00\n"
+        "02.03.2025;Benzin;-1.234,50\n"
+    )
+    bookings = parse_statement("statement.csv", io.BytesIO(csv_text.encode()))
+
+    assert [b['amount'] for b in bookings] == [90.0, 90.0, 1234.5]
+    assert [b['type'] for b in bookings] == ['income', 'income', 'expense']
+    assert bookings[0]['ref'] != bookings[1]['ref']
+    # The first occurrence keeps the ref earlier imports used
+    assert bookings[0]['ref'] == booking_ref("2025-03-01", 90.0, "income", "TWINT Fahrstunde")
+
+    # Importing the same statement again yields the same refs
+    again = parse_statement("statement.csv", io.BytesIO(csv_text.encode()))
+    assert [b['ref'] for b in again] == [b['ref'] for b in bookings]
+
+
+def test_csv_reports_unreadable_rows():
+    csv_text = "Datum;Buchungstext;Betrag\n01.03.2025;Fahrstunde;1,234\n"
+    bookings = parse_statement("statement.csv", io.BytesIO(csv_text.encode()))
+    assert bookings == [{'row': 2, 'error': "Mehrdeutiger Betrag: 1,234"}]
+
+
+def test_camt053():
+    xml = b"""<?xml version="1.0"?>
+<Document xmlns="urn:iso:std:iso:20022:tech:xsd:camt.053.001.04"><BkToCstmrStmt><Stmt>
+  <Ntry><Amt Ccy="CHF">90.00</Amt><CdtDbtInd>CRDT</CdtDbtInd><BookgDt><Dt>2025-03-01</Dt></BookgDt>
+    <AcctSvcrRef>REF1</AcctSvcrRef><AddtlNtryInf>Fahrstunde</AddtlNtryInf></Ntry>
+  <Ntry><Amt Ccy="CHF">40.00</Amt><CdtDbtInd>DBIT</CdtDbtInd><BookgDt><Dt>2025-03-02</Dt></BookgDt>
+    <AddtlNtryInf>Benzin</AddtlNtryInf></Ntry>
+</Stmt></BkToCstmrStmt></Document>"""
+    bookings = parse_statement("statement.xml", io.BytesIO(xml))
+
+    assert [(b['date'], b['amount'], b['type'], b['description']) for b in bookings] == [
+        ("2025-03-01", 90.0, "income", "Fahrstunde"),
+        ("2025-03-02", 40.0, "expense", "Benzin"),
+    ]
+    assert bookings[0]['ref'] == "REF1"
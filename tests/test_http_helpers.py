@@ -0,0 +1,121 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'saferide_test')
+
+import server  # noqa: E402
+from server import HTTPException, etag_matches, parse_range  # noqa: E402
+
+
+def request_with(**headers):
+    return Request({"type": "http", "headers": [(name.replace('_', '-').encode(), value.encode()) for name, value in headers.items()]})
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    (" bytes=5-5 ", (5, 5)),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=-", "bytes=0-9,20-29", "items=0-9", "bytes=a-b"])
+def test_parse_range_ignores_unsupported(header):
+    assert parse_range(header, 1000) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=1000-2000", "bytes=50-10", "bytes=-0"])
+def test_parse_range_not_satisfiable(header):
+    with pytest.raises(HTTPException) as excinfo:
+        parse_range(header, 1000)
+    assert excinfo.value.status_code == 416
+    assert excinfo.value.headers == {"Content-Range": "bytes */1000"}
+
+
+@pytest.mark.parametrize("if_none_match, etag, expected", [
+    ('"abc"', '"abc"', True),
+    ('W/"abc"', '"abc"', True),
+    ('"abc"', 'W/"abc"', True),
+    ('"x", W/"abc" ,"y"', 'W/"abc"', True),
+    ('"x", "y"', '"abc"', False),
+    ('"ab"', '"abc"', False),
+    ('*', 'W/"3.7"', True),
+])
+def test_etag_matches(if_none_match, etag, expected):
+    assert etag_matches(request_with(if_none_match=if_none_match), etag) is expected
+
+
+def test_etag_matches_without_header():
+    assert etag_matches(request_with(), '"abc"') is False
+
+
+@pytest.fixture
+def files(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, 'UPLOAD_DIR', tmp_path)
+    file_name = f"{'a' * 64}.bin"
+    (tmp_path / file_name).write_bytes(bytes(range(100)))
+    return TestClient(server.app), f"/api/files/{file_name}", f'"{"a" * 64}"'
+
+
+def test_file_range_and_conditional_get(files):
+    client, url, etag = files
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers['etag'] == etag
+    assert response.headers['accept-ranges'] == 'bytes'
+
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    response = client.get(url, headers={'Range': 'bytes=-10'})
+    assert response.status_code == 206
+    assert response.headers['content-range'] == 'bytes 90-99/100'
+    assert response.content == bytes(range(90, 100))
+
+    response = client.get(url, headers={'Range': 'bytes=200-'})
+    assert response.status_code == 416
+    assert response.headers['content-range'] == 'bytes */100'
+
+
+def test_file_if_range(files):
+    client, url, etag = files
+
+    response = client.get(url, headers={'Range': 'bytes=0-9', 'If-Range': etag})
+    assert response.status_code == 206
+    assert response.content == bytes(range(10))
+
+    # The client's copy is outdated: send the whole file instead of a part of it
+    response = client.get(url, headers={'Range': 'bytes=0-9', 'If-Range': '"outdated"'})
+    assert response.status_code == 200
+    assert response.content == bytes(range(100))
+
+
+@pytest.mark.parametrize("trans", [
+    {"date": "2025-03-01", "id": "5f0c6a1e-8f3b-4c1e-9d2a-0b6f3c2d1e4f"},
+    {"date": "2025-12-31", "id": "ä-non-ascii"},
+])
+def test_cursor_round_trip(trans):
+    cursor = server.encode_cursor(trans)
+    assert cursor.isascii()
+    assert server.decode_cursor(cursor) == {"$or": [
+        {"date": {"$lt": trans['date']}},
+        {"date": trans['date'], "id": {"$lt": trans['id']}},
+    ]}
+
+
+@pytest.mark.parametrize("cursor", ["!!!", "abc", "MjAyNS0wMy0wMQ==", "_w==", "YXxifGM="])
+def test_invalid_cursor(cursor):
+    with pytest.raises(HTTPException) as excinfo:
+        server.decode_cursor(cursor)
+    assert excinfo.value.status_code == 400
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'saferide_test')
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import server  # noqa: E402
+
+
+async def python_aggregate_ledger(query):
+    # mongomock cannot evaluate RAPPEN_EXPR ($round), so sum in Python
+    groups = {}
+    async for trans in server.db.transactions.find(query, {"_id": 0}):
+        key = tuple(server.summary_key(trans).items())
+        amount, count = groups.get(key, (0, 0))
+        groups[key] = (amount + server.transaction_rappen(trans), count + 1)
+    return [{**dict(key), 'amount_rappen': amount, 'count': count} for key, (amount, count) in groups.items()]
+
+
+@pytest.fixture
+def db(monkeypatch, tmp_path):
+    database = mongomock_motor.AsyncMongoMockClient()['saferide_test']
+    monkeypatch.setattr(server, 'db', database)
+    monkeypatch.setattr(server, 'PDF_CACHE_DIR', tmp_path)
+    monkeypatch.setattr(server, 'account_cache', server.AccountCache(server.ACCOUNT_CACHE_TTL))
+    return database
+
+
+def booking(amount):
+    return server.TransactionCreate(date="2025-03-05", description="Fahrstunde", type="income",
+                                    amount=amount, account_id="a1", payment_method="bar")
+
+
+async def summaries(db):
+    rows = await db.monthly_summaries.find({}, {"_id": 0}).to_list(None)
+    return sorted((row['month'], row['amount_rappen'], row['count']) for row in rows)
+
+
+@pytest.mark.parametrize("scenario", ["increment_before_rename", "increment_after_rename"])
+def test_write_interleaved_with_rebuild(db, monkeypatch, scenario):
+    """A write racing the rebuild ends up counted exactly once."""
+    ledger_read = asyncio.Event()
+    renamed = asyncio.Event()
+    incremented = asyncio.Event()
+    version_reads = 0
+
+    async def aggregate_ledger(query):
+        groups = await python_aggregate_ledger(query)
+        if query == {}:
+            ledger_read.set()
+            if scenario == "increment_before_rename":
+                # The write lands between the ledger read and the rename
+                await incremented.wait()
+        return groups
+
+    async def transaction_month_versions(original=server.transaction_month_versions):
+        nonlocal version_reads
+        version_reads += 1
+        versions = await original()
+        if version_reads == 2:
+            # First read after the rename: let the racing write continue from here
+            renamed.set()
+        return versions
+
+    async def apply_to_summary(trans, sign=1, original=server.apply_to_summary):
+        if scenario == "increment_after_rename":
+            await renamed.wait()
+        await original(trans, sign)
+        incremented.set()
+        if scenario == "increment_before_rename":
+            # Its versions are only bumped after the rebuild read them
+            await renamed.wait()
+
+    asyncio.run(server.create_transaction(booking(40), user={"id": "u1"}))
+    monkeypatch.setattr(server, 'aggregate_ledger', aggregate_ledger)
+    monkeypatch.setattr(server, 'transaction_month_versions', transaction_month_versions)
+    monkeypatch.setattr(server, 'apply_to_summary', apply_to_summary)
+
+    async def write():
+        if scenario == "increment_before_rename":
+            await ledger_read.wait()
+        await server.create_transaction(booking(90), user={"id": "u1"})
+
+    async def main():
+        await asyncio.wait_for(asyncio.gather(write(), server.rebuild_monthly_summaries()), 5)
+        assert await summaries(db) == [("2025-03", 13000, 2)]
+        state = await db.versions.find_one({"key": "transactions:2025-03"})
+        assert state['pending'] == 0
+
+    asyncio.run(main())
+
+
+def test_failed_write_clears_its_mark(db):
+    async def main():
+        with pytest.raises(server.HTTPException):
+            async with server.transaction_write("2025-03"):
+                raise server.HTTPException(status_code=404)
+        state = await db.versions.find_one({"key": "transactions:2025-03"})
+        assert (state['version'], state['pending']) == (1, 0)
+
+    asyncio.run(main())